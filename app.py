@@ -1,12 +1,37 @@
 import streamlit as st
 import requests
+import hashlib
+import html
 import json
+import os
+import threading
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
 import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
 import plotly.express as px
 import plotly.graph_objects as go
+from cachetools import TTLCache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import date, timedelta
+from pathlib import Path
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+import queue
+import re
+import sqlite3
 import time
+import uuid
+from bisect import bisect_left
+from urllib.parse import quote
+import numpy as np
+
+# Column selections and row subsets share memory until written to
+pd.set_option("mode.copy_on_write", True)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # PAGE CONFIG
@@ -357,6 +382,30 @@ html, body, .stApp {
 ACLED_CONFIG = {
     "token_url":    "https://acleddata.com/oauth/token",
     "api_read_url": "https://acleddata.com/api/acled/read?_format=json",
+    "page_size":    5000, # ACLED's per-request row cap
+    "max_workers":  6,    # concurrent country requests sharing one session
+    "max_retries":  4,    # attempts per request on 429 / 5xx / connection errors
+    "store_dir":    ".acled_store",
+    "settle_days":  7,    # ACLED backfills recent weeks, so these days are always re-synced
+    "cache_bytes":  1 << 30,  # in-process dataset cache budget shared by all sessions
+    "cache_ttl":    3600,
+}
+
+BRIEFING_CONFIG = {
+    "cache_path":    ".acled_store/briefings.sqlite",
+    "cache_ttl":     7 * 86400,  # seconds a generated briefing is served from cache
+    "cache_entries": 500,        # least recently used briefings beyond this are dropped
+    "backend_slots": 8,          # concurrent requests per LLM backend, shared by all sessions and jobs
+    "map_workers":   4,          # default concurrent chunk summaries (match the backend's parallel slots)
+    "max_retries":   4,          # attempts per LLM request on 429 / 502-504 / connection errors
+    "chunk_chars":   6000,       # incident-note characters per map-step prompt
+    "reduce_chars":  12000,      # summaries longer than this are summarized again before the final prompt
+}
+
+JOB_CONFIG = {
+    "max_workers":   4,    # background jobs (fetches, briefings) running at once per process
+    "poll_interval": 1.0,  # seconds between status refreshes while a session has a job in flight
+    "keep_seconds":  3600, # finished jobs are forgotten after this long
 }
 
 BASEMAPS = {
@@ -377,25 +426,171 @@ EVENT_COLORS = {
 }
 DEFAULT_COLOR = [71, 85, 105, 180]
 
+# Columns the dashboard reads, first in the ingested frame; the rest of the
+# ACLED record (disorder_type, inter1, tags…) follows, kept only for export
+EVENT_COLUMNS = [
+    "event_id_cnty", "event_date", "event_type", "sub_event_type", "country",
+    "admin1", "admin2", "location", "actor1", "actor2",
+    "latitude", "longitude", "fatalities", "notes", "source",
+]
+# Multiselect filters in the Advanced Filters panel
+FILTER_COLUMNS = ["event_type", "sub_event_type", "country", "admin1", "admin2", "actor1"]
+# Text columns covered by the Data Explorer search index
+SEARCH_COLUMNS = [
+    "notes", "location", "actor1", "actor2", "source",
+    "event_type", "sub_event_type", "country", "admin1", "admin2",
+]
+# Download formats: label -> (file extension, compression codec, MIME type)
+EXPORT_FORMATS = {
+    "CSV":        ("csv",     None,   "text/csv"),
+    "CSV (gzip)": ("csv.gz",  "gzip", "application/gzip"),
+    "CSV (zstd)": ("csv.zst", "zstd", "application/zstd"),
+    "Parquet":    ("parquet", None,   "application/vnd.apache.parquet"),
+}
+# Above this many points the heatmap is fed pre-binned grid cells instead
+HEATMAP_POINT_LIMIT = 20_000
+# Seconds between Temporal playback frames
+PLAYBACK_INTERVAL = 0.6
+# Timeline bucket by filtered date span: (longest span in days, resolution)
+TIMELINE_RESOLUTIONS = [(120, "Daily"), (730, "Weekly"), (None, "Monthly")]
+# Per-point fields shipped to the map for hover tooltips
+MAP_TOOLTIP_COLUMNS = ["event_type", "location", "actor1", "fatalities"]
+# Low-cardinality text stored as category (Arrow dictionary) columns
+CATEGORY_COLUMNS = [
+    "event_type", "sub_event_type", "country", "admin1", "admin2",
+    "location", "actor1", "actor2", "source",
+]
+
 # ─────────────────────────────────────────────────────────────────────────────
 # SESSION STATE
 # ─────────────────────────────────────────────────────────────────────────────
 for k, v in {
     "original_df": pd.DataFrame(),
+    "dataset_id": None,
+    "filter_engine": None,
     "data_fetched": False,
     "map_mode": "Categories",
     "selected_temporal_date": None,
     "is_playing": False,
     "briefing_text": "",
+    "export": None,
+    "fetch_job": None,
+    "briefing_job": None,
+    "tbl_page": 1,
 }.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
+# ─────────────────────────────────────────────────────────────────────────────
+# BACKGROUND JOBS
+# ─────────────────────────────────────────────────────────────────────────────
+class JobCancelled(Exception):
+    """Raised inside a job's function once the job has been cancelled."""
+
+
+class Job:
+    """
+    One unit of background work. The worker reports progress, partial text and
+    warnings on the job object; the session that owns it polls them from
+    fragments, since st.* calls cannot be made off the script thread.
+    """
+
+    def __init__(self, kind, label):
+        self.id       = uuid.uuid4().hex[:12]
+        self.kind     = kind
+        self.label    = label
+        self.created  = time.time()
+        self.fraction = None   # 0..1, or None while the amount of work is unknown
+        self.text     = ""
+        self.partial  = ""     # streamed output so far
+        self.preview  = None   # small DataFrame to show while running
+        self.warnings = []
+        self.consumed = False  # result already applied to the session
+        self.future   = None
+        self._cancel  = threading.Event()
+
+    def report(self, fraction=None, text=None):
+        self.fraction = fraction
+        if text is not None:
+            self.text = text
+
+    def warn(self, message):
+        self.warnings.append(message)
+
+    def check(self):
+        """Call between steps of work: raises JobCancelled after cancel()."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+
+    def cancel(self):
+        self._cancel.set()
+        self.future.cancel()  # never started: drop it outright
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    @property
+    def error(self):
+        """Exception the job failed with (None while running, on success or when cancelled)."""
+        if not self.done or self.future.cancelled():
+            return None
+        exc = self.future.exception()
+        return None if isinstance(exc, JobCancelled) else exc
+
+
+class JobRunner:
+    """Process-wide thread pool for background jobs, addressed by job id."""
+
+    def __init__(self, max_workers, keep_seconds):
+        self._pool        = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs        = {}
+        self._lock        = threading.Lock()
+        self.keep_seconds = keep_seconds
+
+    def submit(self, kind, label, fn, *args, **kwargs):
+        """Run fn(job, *args, **kwargs) in the background; returns the job id."""
+        job = Job(kind, label)
+        job.future = self._pool.submit(fn, job, *args, **kwargs)
+        with self._lock:
+            cutoff = time.time() - self.keep_seconds
+            for job_id in [k for k, j in self._jobs.items() if j.done and j.created < cutoff]:
+                del self._jobs[job_id]
+            self._jobs[job.id] = job
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(JOB_CONFIG["max_workers"], JOB_CONFIG["keep_seconds"])
+
+
+def render_job_progress(job):
+    """Progress line and cancel button for a running job."""
+    jc1, jc2 = st.columns([5, 1])
+    with jc1:
+        if job.fraction is None:
+            st.caption(f"⏳ {job.text or job.label}")
+        else:
+            st.progress(min(max(job.fraction, 0.0), 1.0), text=job.text or job.label)
+    # Cancellation is picked up by the job within a poll or two
+    jc2.button("✖ Cancel", key=f"cancel_{job.id}", use_container_width=True,
+               on_click=job.cancel, disabled=job.cancelled)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # API FUNCTIONS
 # ─────────────────────────────────────────────────────────────────────────────
 @st.cache_data(ttl=86400)
-def get_access_token(username, password, token_url):
+def get_access_token(username, password, token_url, _on_error=st.error):
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     data = {"username": username, "password": password,
             "grant_type": "password", "client_id": "acled"}
@@ -404,117 +599,1154 @@ def get_access_token(username, password, token_url):
         r.raise_for_status()
         return r.json()["access_token"]
     except Exception as e:
-        st.error(f"Auth error: {e}")
+        _on_error(f"Auth error: {e}")
         return None
 
 
-@st.cache_data(ttl=3600)
-def fetch_acled_data(token, countries, start_date, end_date):
+class ACLEDRetryableError(Exception):
+    """Transient ACLED failure (HTTP 429 / 5xx) that is worth retrying."""
+
+
+class ACLEDAPIError(Exception):
+    """ACLED refused the request (HTTP 4xx or a non-200 status in the body); not retried."""
+
+
+@st.cache_resource
+def get_http_session(pool_size=ACLED_CONFIG["max_workers"]):
+    # One keep-alive session shared by every fetch worker in the process
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@retry(
+    retry=retry_if_exception_type((ACLEDRetryableError,
+                                   requests.exceptions.ConnectionError,
+                                   requests.exceptions.Timeout)),
+    wait=wait_exponential(multiplier=1, min=1, max=20),
+    stop=stop_after_attempt(ACLED_CONFIG["max_retries"]),
+    reraise=True,
+)
+def _get_acled_json(session, headers, params):
+    r = session.get(ACLED_CONFIG["api_read_url"], params=params, headers=headers, timeout=30)
+    if r.status_code == 429 or r.status_code >= 500:
+        raise ACLEDRetryableError(f"HTTP {r.status_code}")
+    if r.status_code >= 400:
+        raise ACLEDAPIError(f"HTTP {r.status_code}: {r.text[:200]}")
+    d = r.json()
+    status = d.get("status")
+    if status == 429 or (isinstance(status, int) and status >= 500):
+        raise ACLEDRetryableError(f"ACLED status {status}")
+    if status != 200:
+        raise ACLEDAPIError(f"ACLED status {status}: {d.get('message') or d.get('error') or ''}".strip())
+    return d
+
+
+def _iter_country_pages(session, token, country, start_date, end_date, paginate=True):
+    # Yields one Arrow record batch per ACLED page until a short/empty page
     headers = {"Authorization": f"Bearer {token}"}
-    dfs = []
-    for country in countries:
+    page = 1
+    while True:
         params = {
             "country": country,
             "event_date": f"{start_date.strftime('%Y-%m-%d')}|{end_date.strftime('%Y-%m-%d')}",
             "event_date_where": "BETWEEN",
-            "limit": "5000",
+            "limit": str(ACLED_CONFIG["page_size"]),
+            "page": str(page),
         }
-        try:
-            r = requests.get(ACLED_CONFIG["api_read_url"],
-                             params=params, headers=headers, timeout=30)
-            d = r.json()
-            if d.get("status") == 200 and d.get("data"):
-                dfs.append(pd.DataFrame(d["data"]))
-        except Exception as e:
-            st.warning(f"Error fetching {country}: {e}")
-    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+        # Error responses raise, so an empty page here really means no more rows
+        rows = _get_acled_json(session, headers, params).get("data")
+        if not rows:
+            return
+        yield pa.RecordBatch.from_pylist(rows)
+        if not paginate or len(rows) < ACLED_CONFIG["page_size"]:
+            return
+        page += 1
+
+
+def _stream_country(session, token, country, start_date, end_date, paginate, sink):
+    task = (country, start_date, end_date)
+    try:
+        for batch in _iter_country_pages(session, token, country, start_date, end_date, paginate):
+            sink.put((task, batch))
+    finally:
+        sink.put((task, None))  # end-of-stream marker, also sent on failure
+
+
+def fetch_acled_data(token, tasks, paginate=True, max_workers=ACLED_CONFIG["max_workers"], job=None):
+    """
+    Fetch (country, start_date, end_date) tasks concurrently.
+    Returns {task: pa.Table}, with None for tasks that failed. Progress,
+    a preview of the first page and failures are reported on `job`.
+    """
+    if not tasks:
+        return {}
+    session  = get_http_session()
+    sink     = queue.Queue()
+    batches  = {t: [] for t in tasks}
+    n_rows, finished = 0, 0
+    if job:
+        job.report(0.0, f"Fetching 0/{len(tasks)} requests…")
+    # Workers only do network I/O and push pages onto the queue;
+    # progress is reported from this thread alone
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))))
+    try:
+        futures = {pool.submit(_stream_country, session, token, *t, paginate, sink): t
+                   for t in tasks}
+        while finished < len(tasks):
+            try:
+                task, batch = sink.get(timeout=0.5)
+            except queue.Empty:
+                if job:
+                    job.check()
+                continue
+            if batch is None:
+                finished += 1
+            else:
+                if n_rows == 0 and job:
+                    job.preview = batch.slice(0, 200).to_pandas()
+                batches[task].append(batch)
+                n_rows += batch.num_rows
+            if job:
+                job.check()
+                job.report(finished / len(tasks),
+                           f"{task[0]}: page {len(batches[task])} · "
+                           f"{n_rows:,} rows so far ({finished}/{len(tasks)} requests done)")
+        failed = {t for fut, t in futures.items() if fut.exception() is not None}
+        for fut, t in futures.items():
+            if t in failed and job:
+                job.warn(f"Error fetching {t[0]}: {fut.exception()}")
+    finally:
+        # On cancel, queued requests are dropped and in-flight ones finish unobserved
+        pool.shutdown(wait=False, cancel_futures=True)
+    if job:
+        job.preview = None
+
+    # Pages can disagree on inferred types (e.g. an all-null column), so promote
+    return {
+        t: None if t in failed else
+           pa.concat_tables([pa.Table.from_batches([b]) for b in batches[t]],
+                            promote_options="permissive") if batches[t] else pa.table({})
+        for t in tasks
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LOCAL EVENT STORE
+# ─────────────────────────────────────────────────────────────────────────────
+class EventStore:
+    """
+    Parquet store partitioned as <root>/<country>/<YYYY-MM>.parquet, with a
+    per-country coverage.json ledger of the date ranges already synced.
+    """
+
+    def __init__(self, root):
+        self.root  = Path(root)
+        self._lock = threading.Lock()
+
+    def _country_dir(self, country):
+        return self.root / quote(country, safe="")
+
+    def coverage(self, country):
+        path = self._country_dir(country) / "coverage.json"
+        if not path.exists():
+            return []
+        return [(date.fromisoformat(lo), date.fromisoformat(hi))
+                for lo, hi in json.loads(path.read_text())]
+
+    def missing_ranges(self, country, start_date, end_date):
+        gaps, cursor = [], start_date
+        for lo, hi in self.coverage(country):
+            if hi < cursor:
+                continue
+            if lo > end_date:
+                break
+            if lo > cursor:
+                gaps.append((cursor, lo - timedelta(days=1)))
+            cursor = hi + timedelta(days=1)
+            if cursor > end_date:
+                break
+        if cursor <= end_date:
+            gaps.append((cursor, end_date))
+        return gaps
+
+    def _mark_covered(self, country, start_date, end_date):
+        end_date = min(end_date, date.today() - timedelta(days=ACLED_CONFIG["settle_days"]))
+        if end_date < start_date:
+            return
+        merged = []
+        for lo, hi in sorted(self.coverage(country) + [(start_date, end_date)]):
+            if merged and lo <= merged[-1][1] + timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+            else:
+                merged.append((lo, hi))
+        self._atomic_write(self._country_dir(country) / "coverage.json",
+                           lambda p: p.write_text(json.dumps(
+                               [[lo.isoformat(), hi.isoformat()] for lo, hi in merged])))
+
+    @staticmethod
+    def _atomic_write(path, writer):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        writer(tmp)
+        os.replace(tmp, path)
+
+    def write(self, country, table, start_date, end_date, complete=True):
+        # Merge new rows into each touched month; ACLED revisions win over stored rows
+        with self._lock:
+            if table.num_rows:
+                months = pc.utf8_slice_codeunits(table["event_date"], 0, 7)
+                for month in pc.unique(months).to_pylist():
+                    path = self._country_dir(country) / f"{month}.parquet"
+                    new  = table.filter(pc.equal(months, month)).to_pandas()
+                    if path.exists():
+                        new = (pd.concat([new, pq.read_table(path).to_pandas()], ignore_index=True)
+                               .drop_duplicates(subset="event_id_cnty", keep="first"))
+                    self._atomic_write(path, lambda p: pq.write_table(
+                        pa.Table.from_pandas(new, preserve_index=False), p))
+            if complete:
+                self._mark_covered(country, start_date, end_date)
+
+    def load(self, countries, start_date, end_date):
+        lo, hi = start_date.isoformat(), end_date.isoformat()
+        months = pd.period_range(start_date, end_date, freq="M").strftime("%Y-%m")
+        tables = []
+        for country in countries:
+            for month in months:
+                path = self._country_dir(country) / f"{month}.parquet"
+                if path.exists():
+                    t = pq.read_table(path)
+                    tables.append(t.filter(pc.and_(pc.greater_equal(t["event_date"], lo),
+                                                   pc.less_equal(t["event_date"], hi))))
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options="permissive")
+
+
+@st.cache_resource
+def get_event_store():
+    return EventStore(ACLED_CONFIG["store_dir"])
+
+
+def sync_event_store(store, countries, start_date, end_date, paginate, token_fn, job=None):
+    """
+    Download only the (country, date) ranges the store does not hold yet.
+    Returns (countries that received new rows, tasks that failed to sync);
+    the first is None if auth failed.
+    """
+    tasks = tuple((c, lo, hi) for c in countries
+                  for lo, hi in store.missing_ranges(c, start_date, end_date))
+    if not tasks:
+        return set(), set()
+    token = token_fn()
+    if not token:
+        return None, set(tasks)
+    written, failed = set(), set()
+    for (country, lo, hi), table in fetch_acled_data(token, tasks, paginate, job=job).items():
+        if table is None:
+            failed.add((country, lo, hi))
+        else:
+            # Without pagination a full page may be truncated, so don't mark it synced
+            complete = paginate or table.num_rows < ACLED_CONFIG["page_size"]
+            store.write(country, table, lo, hi, complete=complete)
+            if table.num_rows:
+                written.add(country)
+    return written, failed
+
+
+def normalize_events(table):
+    """
+    Build the compact, typed event frame once at ingest: EVENT_COLUMNS come
+    first, low-cardinality strings become dictionary/category columns, free
+    text and the columns only the filtered export uses stay Arrow-backed, and
+    numerics are downcast.
+    """
+    names = [c for c in EVENT_COLUMNS if c in table.column_names]
+    table = table.select(names + [c for c in table.column_names if c not in names])
+    for c in CATEGORY_COLUMNS:
+        if c in table.column_names:
+            i = table.column_names.index(c)
+            table = table.set_column(i, c, pc.cast(table[c], pa.string()).dictionary_encode())
+    df = table.unify_dictionaries().to_pandas(
+        types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get
+    )
+    df["event_date"] = pd.to_datetime(df["event_date"])
+    df["latitude"]   = pd.to_numeric(df["latitude"],  errors="coerce").astype("float32")
+    df["longitude"]  = pd.to_numeric(df["longitude"], errors="coerce").astype("float32")
+    df["fatalities"] = (pd.to_numeric(df["fatalities"], errors="coerce")
+                        .fillna(0).astype("int32"))
+    return df.dropna(subset=["latitude", "longitude"]).reset_index(drop=True)
+
+
+def load_events(store, countries, start_date, end_date):
+    table = store.load(countries, start_date, end_date)
+    return normalize_events(table) if table is not None else pd.DataFrame()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# DATASET CACHE
+# ─────────────────────────────────────────────────────────────────────────────
+class DatasetCache:
+    """
+    Ingested event frames shared by every session in the process, keyed only
+    on the normalized query. Entries expire after `ttl` seconds and are evicted
+    LRU once their combined in-memory size exceeds `max_bytes`.
+    Cached frames are shared: callers must treat them as read-only.
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self._entries   = TTLCache(maxsize=max_bytes, ttl=ttl,
+                                   getsizeof=lambda df: int(df.memory_usage(deep=True).sum()) or 1)
+        self._lock      = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def key(countries, start_date, end_date):
+        return tuple(sorted(set(countries))), start_date, end_date
+
+    def get_or_load(self, key, loader):
+        """
+        Cached frame for `key`, else `loader()`, which returns (frame, complete).
+        Incomplete frames are served but not stored, so the next request retries.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Concurrent sessions asking for the same query wait for a single load
+        with key_lock:
+            with self._lock:
+                df = self._entries.get(key)
+            if df is None:
+                df, complete = loader()
+                if complete and not df.empty:
+                    with self._lock:
+                        try:
+                            self._entries[key] = df
+                        except ValueError:
+                            pass  # larger than the whole budget: serve it uncached
+        return df
+
+    def invalidate(self, countries):
+        with self._lock:
+            for key in [k for k in self._entries if set(k[0]) & set(countries)]:
+                self._entries.pop(key, None)
+
+
+@st.cache_resource
+def get_dataset_cache():
+    return DatasetCache(ACLED_CONFIG["cache_bytes"], ACLED_CONFIG["cache_ttl"])
+
+
+class EventView:
+    """
+    Filtered view over the shared, read-only base frame. Only the selected row
+    positions are held; columns are gathered on demand, so each consumer pays
+    for the columns and rows it actually renders.
+    """
+
+    def __init__(self, base, rows):
+        self.base = base
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    def sorted_rows(self, column, ascending=True, rows=None):
+        """Base-frame positions of this view (or a subset of it) ordered by `column`."""
+        positions = self.rows if rows is None else self.rows[rows]
+        col = self.base[column]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            # Category codes follow load order, so sort on each category's alphabetical rank
+            rank  = np.argsort(np.argsort(col.cat.categories.astype(str)))
+            codes = col.cat.codes.to_numpy()[positions]
+            key   = pd.Series(np.where(codes >= 0, rank[codes], np.nan))
+        else:
+            key = col.take(positions).reset_index(drop=True)
+        order = key.sort_values(ascending=ascending, kind="stable", na_position="last").index
+        return positions[order.to_numpy()]
+
+    def frame(self, columns=None, rows=None):
+        # `rows` indexes into this view (positions, slice or boolean mask)
+        columns = [c for c in (columns or self.base.columns) if c in self.base.columns]
+        return self.base[columns].take(self.rows if rows is None else self.rows[rows])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# FILTER INDEX
+# ─────────────────────────────────────────────────────────────────────────────
+def dataset_fingerprint(df):
+    """
+    Stable id for a loaded frame, used to key per-dataset indexes. Every column
+    is hashed: a re-sync can revise fatalities, notes or admin fields while
+    keeping the same event ids, and must not be served the old indexes.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    h.update("\x1f".join(df.columns).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ColumnIndex:
+    """
+    value → rows posting lists for one category column: row positions grouped
+    by category code (CSR layout over a stable argsort of the codes).
+    """
+
+    def __init__(self, series):
+        codes  = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        order  = np.argsort(codes, kind="stable").astype(np.int32)
+        n_null = int((codes < 0).sum())
+        self.n        = len(codes)
+        self.nulls    = order[:n_null]            # missing values never match, like isin
+        self.postings = order[n_null:]
+        self.offsets  = np.concatenate([[0], np.cumsum(counts)])
+        self.code_of  = {v: i for i, v in enumerate(series.cat.categories) if counts[i]}
+        self.options  = sorted(self.code_of)
+
+    def _rows(self, codes):
+        if not codes:
+            return self.postings[:0]
+        return np.concatenate([self.postings[self.offsets[c]:self.offsets[c + 1]] for c in codes])
+
+    def mask(self, selected):
+        """Boolean row mask for `value in selected`, or None if it keeps every row."""
+        chosen = {self.code_of[v] for v in selected if v in self.code_of}
+        if len(chosen) == len(self.code_of) and not len(self.nulls):
+            return None
+        # Touch whichever side of the selection has fewer postings
+        n_chosen = sum(int(self.offsets[c + 1] - self.offsets[c]) for c in chosen)
+        if n_chosen <= (self.n - len(self.nulls)) // 2:
+            m = np.zeros(self.n, dtype=bool)
+            m[self._rows(sorted(chosen))] = True
+        else:
+            m = np.ones(self.n, dtype=bool)
+            m[self.nulls] = False
+            m[self._rows(sorted(set(self.code_of.values()) - chosen))] = False
+        return m
+
+
+class FilterIndex:
+    """Per-dataset filter structures, built once at load and shared by all sessions."""
+
+    def __init__(self, df):
+        self.columns        = {c: ColumnIndex(df[c]) for c in FILTER_COLUMNS}
+        self.fatalities     = df["fatalities"].to_numpy()
+        self.max_fatalities = int(self.fatalities.max()) if len(df) else 0
+
+        a1, a2 = df["admin1"].cat.codes.to_numpy(), df["admin2"].cat.codes.to_numpy()
+        pairs  = np.unique(np.stack([a1, a2], axis=1)[(a1 >= 0) & (a2 >= 0)], axis=0)
+        self.admin2_by_admin1 = {}
+        for c1, c2 in pairs:
+            self.admin2_by_admin1.setdefault(df["admin1"].cat.categories[c1], []).append(
+                df["admin2"].cat.categories[c2])
+
+    def options(self, column):
+        return self.columns[column].options
+
+    def admin2_options(self, admin1_values):
+        return sorted({a2 for a1 in admin1_values for a2 in self.admin2_by_admin1.get(a1, ())})
+
+    def fatality_mask(self, fat_range):
+        if tuple(fat_range) == (0, self.max_fatalities):
+            return None
+        return (self.fatalities >= fat_range[0]) & (self.fatalities <= fat_range[1])
+
+
+@st.cache_resource(max_entries=8)
+def get_filter_index(dataset_id, _df):
+    return FilterIndex(_df)
+
+
+class FilterEngine:
+    """
+    Per-session incremental filter evaluation. Each predicate's mask is cached
+    against its widget value and rebuilt only when that value changes. The
+    combined mask is fingerprinted; downstream results stored via `memo` are
+    dropped only when the fingerprint actually changes.
+    """
+
+    def __init__(self, dataset_id, fidx, base):
+        self.dataset_id  = dataset_id
+        self.fidx        = fidx
+        self.base        = base
+        self.digest      = None
+        self.view        = None
+        self._predicates = {}   # name -> (widget value, mask or None)
+        self._memo       = {}
+
+    def _predicate(self, name, value, build):
+        cached = self._predicates.get(name)
+        if cached is not None and cached[0] == value:
+            return cached[1], False
+        self._predicates[name] = (value, build())
+        return self._predicates[name][1], True
+
+    def apply(self, selections, fat_range):
+        """Re-evaluate changed predicates; returns True if the filtered rows changed."""
+        masks, dirty = [], False
+        for column in FILTER_COLUMNS:
+            selected = selections.get(column)
+            value    = None if selected is None else frozenset(selected)
+            m, rebuilt = self._predicate(
+                column, value,
+                lambda: None if selected is None else self.fidx.columns[column].mask(selected))
+            masks.append(m)
+            dirty |= rebuilt
+        m, rebuilt = self._predicate("fatalities", tuple(fat_range),
+                                     lambda: self.fidx.fatality_mask(fat_range))
+        masks.append(m)
+        dirty |= rebuilt
+        if not dirty and self.view is not None:
+            return False
+
+        mask = np.ones(len(self.base), dtype=bool)
+        for m in masks:
+            if m is not None:
+                mask &= m
+        digest = hashlib.blake2b(np.packbits(mask).tobytes(), digest_size=12).hexdigest()
+        if digest == self.digest:
+            return False
+        self.digest = digest
+        self.view   = EventView(self.base, np.flatnonzero(mask))
+        self._memo  = {}
+        return True
+
+    def memo(self, key, compute):
+        """Result of `compute()` cached until the filtered rows change."""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SUMMARY STATISTICS
+# ─────────────────────────────────────────────────────────────────────────────
+def timeline_resolution(days):
+    """Coarsest-needed bucket for a set of days (days since epoch)."""
+    span = int(days.max() - days.min()) + 1 if len(days) else 0
+    for longest, resolution in TIMELINE_RESOLUTIONS:
+        if longest is None or span <= longest:
+            return resolution
+
+
+def bucket_days(days, resolution):
+    """First day of the daily / weekly (Monday) / monthly bucket holding each day."""
+    if resolution == "Weekly":
+        return days - (days + 3) % 7  # 1970-01-01, day 0, was a Thursday
+    if resolution == "Monthly":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    return days
+
+
+class StatsEngine:
+    """
+    Per-dataset arrays behind the headline statistics. `summarize` covers any
+    row subset in one pass over the category codes (a bincount per column),
+    and its result feeds the KPI cards, the Analytics charts and the briefing
+    prompt.
+    """
+
+    COUNT_COLUMNS  = ("admin1", "event_type", "actor1")
+    DETAIL_COLUMNS = ["event_date", "event_type", "location", "fatalities", "notes"]
+
+    def __init__(self, df):
+        self.detail     = df[self.DETAIL_COLUMNS]  # not the whole frame: this outlives its cache entry
+        self.codes      = {c: df[c].cat.codes.to_numpy() for c in self.COUNT_COLUMNS}
+        self.categories = {c: df[c].cat.categories for c in self.COUNT_COLUMNS}
+        self.fatalities = df["fatalities"].to_numpy()
+        self.days       = df["event_date"].to_numpy().astype("datetime64[D]")
+        self.has_note   = df["notes"].fillna("").str.strip().ne("").to_numpy(dtype=bool)
+
+    def summarize(self, rows, n_deadliest=3):
+        fat    = self.fatalities[rows]
+        counts, totals = {}, {}
+        for c in self.COUNT_COLUMNS:
+            codes = self.codes[c][rows]
+            known = codes >= 0
+            n     = np.bincount(codes[known], minlength=len(self.categories[c]))
+            f     = np.bincount(codes[known], weights=fat[known], minlength=len(n)).astype(np.int64)
+            order = np.argsort(-n, kind="stable")
+            order = order[n[order] > 0]
+            counts[c] = pd.Series(n[order], index=self.categories[c][order])
+            totals[c] = pd.DataFrame({c: self.categories[c][order], "events": n[order],
+                                      "fatalities": f[order]})
+        k    = min(n_deadliest, len(rows))
+        top  = np.argpartition(-fat, k - 1)[:k] if k else np.array([], dtype=np.int64)
+        top  = top[np.argsort(-fat[top], kind="stable")]
+        days = self.days[rows]
+        resolution = timeline_resolution(days.astype(np.int64))
+        buckets, inverse = np.unique(bucket_days(days.astype(np.int64), resolution), return_inverse=True)
+        return {
+            "events":     len(rows),
+            "fatalities": int(fat.sum()),
+            "first_day":  pd.Timestamp(days.min()) if len(rows) else None,
+            "last_day":   pd.Timestamp(days.max()) if len(rows) else None,
+            "days_span":  max(int((days.max() - days.min()).astype(np.int64)), 1) if len(rows) else 1,
+            "counts":     counts,
+            "totals":     totals,   # per value: events and fatalities, by events descending
+            "resolution": resolution,
+            "timeline":   pd.DataFrame({
+                "event_date": buckets.astype("datetime64[D]").tolist(),
+                "events":     np.bincount(inverse, minlength=len(buckets)),
+                "fatalities": np.bincount(inverse, weights=fat, minlength=len(buckets)).astype(np.int64),
+            }),
+            "deadliest":  self.detail.take(rows[top]).to_dict("records"),
+        }
+
+    def sample_notes(self, rows, k=20, seed=42, max_chars=400):
+        """Up to `k` non-empty incident notes drawn at random from `rows`."""
+        rows = rows[self.has_note[rows]]
+        pick = np.random.default_rng(seed).choice(len(rows), min(k, len(rows)), replace=False)
+        return [n[:max_chars] for n in self.detail["notes"].take(rows[np.sort(pick)]).to_numpy()]
+
+
+@st.cache_resource(max_entries=8)
+def get_stats_engine(dataset_id, _df):
+    return StatsEngine(_df)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TEMPORAL INDEX
+# ─────────────────────────────────────────────────────────────────────────────
+class TemporalIndex:
+    """
+    Filtered rows sorted by event day, with a [start, end) offset per day and a
+    fatality prefix sum, so any day, trailing window or cumulative frame is one
+    contiguous slice instead of a date comparison over every row.
+    """
+
+    def __init__(self, base, rows):
+        days    = base["event_date"].to_numpy()[rows].astype("datetime64[D]")
+        order   = np.argsort(days, kind="stable")
+        self.rows = rows[order]
+        self.days, starts = np.unique(days[order], return_index=True)
+        self.offsets = np.append(starts, len(order))
+        self.dates   = self.days.tolist()  # datetime.date, for widgets
+        self.fatality_prefix = np.concatenate(
+            [[0], np.cumsum(base["fatalities"].to_numpy()[self.rows], dtype=np.int64)])
+
+    def window(self, day, n_days=1):
+        """[lo, hi) positions in `rows` for the `n_days` days ending at `day` (None = since start)."""
+        end = np.datetime64(day, "D")
+        hi  = np.searchsorted(self.days, end, side="right")
+        lo  = 0 if n_days is None else np.searchsorted(self.days, end - (n_days - 1), side="left")
+        return int(self.offsets[lo]), int(self.offsets[hi])
+
+    def window_rows(self, day, n_days=1):
+        lo, hi = self.window(day, n_days)
+        return self.rows[lo:hi]
+
+    def window_fatalities(self, day, n_days=1):
+        lo, hi = self.window(day, n_days)
+        return int(self.fatality_prefix[hi] - self.fatality_prefix[lo])
+
+    def next_date(self, day):
+        i = np.searchsorted(self.days, np.datetime64(day, "D"), side="right")
+        return self.dates[i % len(self.dates)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MAP STYLING
+# ─────────────────────────────────────────────────────────────────────────────
+def style_events(df, mode):
+    """
+    RGBA fill colour (uint8, one row per event in the base frame) for a map
+    mode. Categories/Temporal look the event_type category code up in a small
+    colour table; Impact shades alpha by fatalities.
+    """
+    if mode == "Impact":
+        rgba = np.empty((len(df), 4), dtype=np.uint8)
+        rgba[:, :3] = (185, 28, 28)
+        rgba[:, 3]  = np.minimum(220, 120 + df["fatalities"].to_numpy(dtype=np.int64) * 4)
+        return rgba
+    palette = np.array(
+        [EVENT_COLORS.get(c, DEFAULT_COLOR) for c in df["event_type"].cat.categories] + [DEFAULT_COLOR],
+        dtype=np.uint8,
+    )
+    return palette[df["event_type"].cat.codes.to_numpy()]  # code -1 (missing) hits the last row
+
+
+@st.cache_resource(max_entries=16)
+def get_event_styles(dataset_id, mode, _df):
+    return style_events(_df, mode)
+
+
+def with_rgba(df, rgba):
+    # Separate uint8 channels, read client-side with a "[r, g, b, a]" accessor
+    return df.assign(r=rgba[:, 0], g=rgba[:, 1], b=rgba[:, 2], a=rgba[:, 3])
+
+
+def grid_bins(lon, lat, fatalities, level):
+    """
+    Aggregate points into Web-Mercator tiles at zoom `level` (the quadkey grid).
+    Returns one row per occupied cell: centre lon/lat, event count, fatality sum.
+    """
+    n   = 1 << level
+    lat = np.radians(np.clip(lat.astype(np.float64), -85.0511, 85.0511))
+    x   = np.clip(((lon.astype(np.float64) + 180.0) / 360.0 * n).astype(np.int64), 0, n - 1)
+    y   = np.clip(((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n).astype(np.int64), 0, n - 1)
+    cells, inverse = np.unique(x * n + y, return_inverse=True)
+    cx, cy = cells // n + 0.5, cells % n + 0.5
+    return pd.DataFrame({
+        "lon":        (cx / n * 360.0 - 180.0).round(5),
+        "lat":        np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * cy / n)))).round(5),
+        "count":      np.bincount(inverse),
+        "fatalities": np.bincount(inverse, weights=fatalities).astype(np.int64),
+    })
+
+
+def grid_cell_metres(level, lat):
+    return 40_075_016.0 * np.cos(np.radians(lat)) / (1 << level)
+
+
+class CompactDeck(pdk.Deck):
+    """pdk.Deck whose JSON spec (what st.pydeck_chart ships) has no indentation."""
+
+    def to_json(self):
+        return json.dumps(self, sort_keys=True, default=default_serialize, separators=(",", ":"))
+
+
+def map_payload(base, positions, tooltip=True):
+    """
+    Slim layer data: coordinates rounded to ~1 m, the base row position `i`
+    (used to load full event details on click) and, optionally, the short
+    tooltip fields. Free text such as notes is never sent to the browser.
+    """
+    out = pd.DataFrame({
+        "lon": base["longitude"].to_numpy()[positions].astype(np.float64).round(5),
+        "lat": base["latitude"].to_numpy()[positions].astype(np.float64).round(5),
+        "i":   positions,
+    })
+    if tooltip:
+        for c in MAP_TOOLTIP_COLUMNS:
+            out[c] = base[c].to_numpy()[positions]
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SEARCH INDEX
+# ─────────────────────────────────────────────────────────────────────────────
+def _tokenize(text):
+    return re.findall(r"[^\W_]+", text.lower())
+
+
+class SearchIndex:
+    """
+    Inverted index over SEARCH_COLUMNS: a sorted vocabulary with one sorted
+    row-position posting list per token (CSR). Tokenizing runs in Arrow, so
+    no per-row Python strings are created while building.
+    """
+
+    def __init__(self, df):
+        # Only the searched columns are kept, for confirming phrases
+        self.text = df[[c for c in SEARCH_COLUMNS if c in df.columns]]
+        self.n    = len(df)
+        rows, tokens = [], []
+        for col in self.text.columns:
+            arr = pa.array(df[col], from_pandas=True)
+            if pa.types.is_dictionary(arr.type):
+                arr = arr.dictionary_decode()
+            words = pc.split_pattern_regex(pc.utf8_lower(pc.cast(arr, pa.string())),
+                                           r"[^\p{L}\p{N}]+")
+            flat, parent = pc.list_flatten(words), pc.list_parent_indices(words)
+            keep = pc.not_equal(flat, "")
+            rows.append(parent.filter(keep).to_numpy())
+            tokens.append(flat.filter(keep))
+
+        encoded = pc.dictionary_encode(pa.chunked_array(tokens, pa.string()).combine_chunks())
+        order   = pc.sort_indices(encoded.dictionary).to_numpy()
+        rank    = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        # One sort over (token rank, row) keys also drops repeated tokens per row
+        keys = np.unique(rank[encoded.indices.to_numpy()] * max(self.n, 1) + np.concatenate(rows))
+        self.vocab    = encoded.dictionary.take(pa.array(order)).to_pylist()
+        self.postings = (keys % max(self.n, 1)).astype(np.int32)
+        self.offsets  = np.searchsorted(keys // max(self.n, 1), np.arange(len(self.vocab) + 1))
+
+    def _prefix_rows(self, token):
+        # Tokens sharing a prefix are adjacent in the vocabulary, so their
+        # postings form one contiguous slice
+        lo = bisect_left(self.vocab, token)
+        hi = bisect_left(self.vocab, token + "\U0010ffff", lo)
+        return np.unique(self.postings[self.offsets[lo]:self.offsets[hi]])
+
+    def search(self, query):
+        """
+        Sorted row positions matching every word (as a token prefix) and every
+        "quoted phrase" in `query`, or None if the query has no words.
+        """
+        phrases = [p for p in re.findall(r'"([^"]+)"', query) if p.strip()]
+        words   = _tokenize(re.sub(r'"[^"]*"?', " ", query)) + [w for p in phrases for w in _tokenize(p)]
+        if not words:
+            return None
+        rows = None
+        for word in sorted(set(words), key=len, reverse=True):
+            hits = self._prefix_rows(word)
+            rows = hits if rows is None else np.intersect1d(rows, hits, assume_unique=True)
+            if not len(rows):
+                return rows
+        # Token hits are a superset for phrases; confirm the literal text on candidates only
+        for phrase in phrases:
+            found = np.zeros(len(rows), dtype=bool)
+            for col in self.text.columns:
+                found |= (self.text[col].take(rows).astype("string")
+                          .str.contains(phrase, case=False, regex=False)
+                          .fillna(False).to_numpy(dtype=bool))
+            rows = rows[found]
+        return rows
+
+
+@st.cache_resource(max_entries=4)
+def get_search_index(dataset_id, _df):
+    return SearchIndex(_df)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# EXPORT
+# ─────────────────────────────────────────────────────────────────────────────
+def export_rows(base, rows, columns, fmt, chunk_rows=50_000):
+    """
+    Encode base[columns] at `rows` in EXPORT_FORMATS[fmt], streaming chunk by
+    chunk through an Arrow writer so the full text is never built in pandas.
+    """
+    _, codec, _ = EXPORT_FORMATS[fmt]
+    frame  = base[columns]
+
+    def chunk(lo):
+        t = pa.Table.from_pandas(frame.take(rows[lo:lo + chunk_rows]), preserve_index=False)
+        # Event dates carry no time of day; write them as plain dates
+        for i, field in enumerate(t.schema):
+            if pa.types.is_timestamp(field.type):
+                t = t.set_column(i, field.name, pc.cast(t[field.name], pa.date32()))
+        return t.replace_schema_metadata(None)
+
+    sink   = pa.BufferOutputStream()
+    first  = chunk(0)
+    if fmt == "Parquet":
+        with pq.ParquetWriter(sink, first.schema, compression="zstd") as writer:
+            writer.write_table(first)
+            for lo in range(chunk_rows, len(rows), chunk_rows):
+                writer.write_table(chunk(lo))
+    else:
+        stream = pa.CompressedOutputStream(sink, codec) if codec else sink
+        with pcsv.CSVWriter(stream, first.schema) as writer:
+            writer.write_table(first)
+            for lo in range(chunk_rows, len(rows), chunk_rows):
+                writer.write_table(chunk(lo))
+        if codec:
+            stream.close()  # flushes the compressed trailer into `sink`
+    return sink.getvalue().to_pybytes()
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # LLM BRIEFING
 # ─────────────────────────────────────────────────────────────────────────────
-def call_ollama(prompt: str, model: str = "mistral", host: str = "http://localhost:11434") -> str:
-    try:
-        r = requests.post(
-            f"{host}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
-            timeout=120,
-        )
+class LLMRetryableError(Exception):
+    """Backend overloaded or still loading the model; retried with backoff."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class LLMStreamError(Exception):
+    """A streamed response failed or broke off before the backend reported completion."""
+
+
+class LLMClient:
+    """
+    Process-wide transport for the briefing backends: one pooled keep-alive
+    session, retries with exponential backoff on 429 / 502-504, and a slot
+    semaphore per backend so every session, job and map-reduce worker waits
+    in one shared queue. Each call appends latency, time-to-first-token and
+    token counts to a rolling log.
+    """
+
+    def __init__(self, slots, history=500):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=slots)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.slots   = slots
+        self.calls   = deque(maxlen=history)
+        self._queues = {}
+        self._lock   = threading.Lock()
+
+    def _queue(self, backend):
+        with self._lock:
+            return self._queues.setdefault(backend, threading.BoundedSemaphore(self.slots))
+
+    @contextmanager
+    def call(self, backend, model):
+        """Hold one of `backend`'s slots; yields the call's metrics record to fill in."""
+        record = {"backend": backend, "model": model, "ok": False, "ttft": None,
+                  "prompt_tokens": 0, "completion_tokens": 0, "start": time.perf_counter()}
+        with self._queue(backend):
+            record["queued"] = time.perf_counter() - record["start"]
+            try:
+                yield record
+            finally:
+                record["latency"] = time.perf_counter() - record["start"]
+                with self._lock:
+                    self.calls.append(record)
+
+    @staticmethod
+    def first_token(record):
+        if record["ttft"] is None:
+            record["ttft"] = time.perf_counter() - record["start"]
+
+    @retry(
+        retry=retry_if_exception_type((LLMRetryableError, requests.exceptions.ConnectionError)),
+        wait=wait_exponential(multiplier=1, min=1, max=20),
+        stop=stop_after_attempt(BRIEFING_CONFIG["max_retries"]),
+        reraise=True,
+    )
+    def post(self, url, **kwargs):
+        r = self.session.post(url, **kwargs)
+        if r.status_code in (429, 502, 503, 504):
+            r.close()
+            raise LLMRetryableError(r.status_code)
+        return r
+
+    def stats(self):
+        """Success rate, time-to-first-token percentiles and token totals over the rolling log."""
+        with self._lock:
+            calls = list(self.calls)
+        if not calls:
+            return None
+        ttft = np.array([c["ttft"] for c in calls if c["ttft"] is not None])
+        return {
+            "calls":        len(calls),
+            "success_rate": sum(c["ok"] for c in calls) / len(calls),
+            "ttft_p50":     float(np.percentile(ttft, 50)) if len(ttft) else None,
+            "ttft_p95":     float(np.percentile(ttft, 95)) if len(ttft) else None,
+            "tokens":       sum(c["prompt_tokens"] + c["completion_tokens"] for c in calls),
+        }
+
+
+@st.cache_resource
+def get_llm_client():
+    return LLMClient(BRIEFING_CONFIG["backend_slots"])
+
+
+def call_ollama(prompt: str, model: str = "mistral", host: str = "http://localhost:11434") -> tuple:
+    """(text, ok): ok only when Ollama reports the response done; text is None if unreachable."""
+    client = get_llm_client()
+    with client.call(f"ollama:{host}", model) as record:
+        try:
+            r = client.post(
+                f"{host}/api/generate",
+                json={"model": model, "prompt": prompt, "stream": False},
+                timeout=120,
+            )
+        except requests.exceptions.ConnectionError:
+            return None, False
+        except LLMRetryableError as e:
+            return f"Ollama error {e.status_code}: backend still busy after {BRIEFING_CONFIG['max_retries']} attempts.", False
         if r.status_code == 200:
-            return r.json().get("response", "No response from Ollama.")
-        return f"Ollama error {r.status_code}: {r.text[:300]}"
-    except requests.exceptions.ConnectionError:
-        return None
+            body = r.json()
+            client.first_token(record)
+            if not body.get("done") or not body.get("response"):
+                return "No response from Ollama.", False
+            record.update(ok=True, prompt_tokens=body.get("prompt_eval_count", 0),
+                          completion_tokens=body.get("eval_count", 0))
+            return body["response"], True
+        return f"Ollama error {r.status_code}: {r.text[:300]}", False
+
+
+# THE NEW URL: This is mandatory to fix Error 410
+HF_ROUTER_URL = "https://router.huggingface.co/hf-inference/v1/chat/completions"
+# SmolLM2 is high-availability for free users
+HF_MODEL_ID   = "HuggingFaceTB/SmolLM2-1.7B-Instruct"
+
+
+def _hf_payload(prompt: str, stream: bool = False) -> dict:
+    # We use the 'messages' format which the new router handles best
+    return {
+        "model": HF_MODEL_ID,
+        "messages": [
+            {"role": "system", "content": "You are a professional security analyst."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 1000,
+        "temperature": 0.3,
+        "stream": stream,
+        **({"stream_options": {"include_usage": True}} if stream else {}),
+    }
+
+
+def _hf_status_message(status_code):
+    # Check for the model waking up (503)
+    if status_code == 503:
+        return "⏳ Free-tier model is waking up. Please wait 20 seconds and click Generate again."
+    # Check for 404 (Specific to the router migration)
+    if status_code == 404:
+        return "❌ Router Error 404: This model is temporarily unavailable. Try again in a moment."
+    return None
 
 
-def call_huggingface(prompt: str, hf_token: str = "") -> str:
+def call_huggingface(prompt: str, hf_token: str = "") -> tuple:
     """
     ULTIMATE ROUTER FIX:
     Uses the new 'router.huggingface.co' domain and SmolLM2 for Free Tier.
+    Returns (text, ok); ok only when the router returned a completion.
     """
-    # THE NEW URL: This is mandatory to fix Error 410
-    url = "https://router.huggingface.co/hf-inference/v1/chat/completions"
-    
-    # SmolLM2 is high-availability for free users
-    model_id = "HuggingFaceTB/SmolLM2-1.7B-Instruct"
-
     clean_token = hf_token.strip()
     if not clean_token:
-        return "❌ Error: Please enter your Hugging Face Token in the sidebar."
+        return "❌ Error: Please enter your Hugging Face Token in the sidebar.", False
 
     headers = {
         "Authorization": f"Bearer {clean_token}",
         "Content-Type": "application/json"
     }
 
-    # We use the 'messages' format which the new router handles best
-    payload = {
-        "model": model_id,
-        "messages": [
-            {"role": "system", "content": "You are a professional security analyst."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 1000,
-        "temperature": 0.3
-    }
+    client = get_llm_client()
+    with client.call("hf-router", HF_MODEL_ID) as record:
+        try:
+            # 503 (model waking up) and 429 are retried with backoff inside client.post
+            response = client.post(HF_ROUTER_URL, headers=headers, json=_hf_payload(prompt), timeout=120)
 
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
-        
-        # Check for the model waking up (503)
-        if response.status_code == 503:
-            return "⏳ Free-tier model is waking up. Please wait 20 seconds and click Generate again."
-        
-        # Check for 404 (Specific to the router migration)
-        if response.status_code == 404:
-            return "❌ Router Error 404: This model is temporarily unavailable. Try again in a moment."
-
-        response.raise_for_status()
-        result = response.json()
-        
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"].strip()
-            
-        return "⚠️ Received an empty response from the server."
+            status_message = _hf_status_message(response.status_code)
+            if status_message:
+                return status_message, False
 
-    except Exception as e:
-        return f"HF Router Error: {str(e)}"
-        
-def build_briefing_prompt(df: pd.DataFrame, context: str = "") -> str:
-    total_events     = len(df)
-    total_fatalities = int(df["fatalities"].sum())
-    date_range       = (f"{df['event_date'].min().strftime('%d %b %Y')} – "
-                        f"{df['event_date'].max().strftime('%d %b %Y')}")
-    regions     = df["admin1"].dropna().value_counts().head(5).to_dict()
-    event_types = df["event_type"].dropna().value_counts().to_dict()
-    actors      = df["actor1"].dropna().value_counts().head(8).to_dict()
-    deadliest   = (df.nlargest(3, "fatalities")
-                     [["event_date", "event_type", "location", "fatalities", "notes"]]
-                     .to_dict("records"))
-
-    notes_col = df["notes"].dropna().loc[df["notes"].str.strip() != ""]
-    notes_sample = notes_col.sample(min(20, len(notes_col)), random_state=42).tolist()
-    notes_block  = "\n".join(f"- {n[:400]}" for n in notes_sample)
+            response.raise_for_status()
+            result = response.json()
+            client.first_token(record)
+
+            if "choices" in result and len(result["choices"]) > 0:
+                text = (result["choices"][0]["message"]["content"] or "").strip()
+                if text:
+                    usage = result.get("usage", {})
+                    record.update(ok=True, prompt_tokens=usage.get("prompt_tokens", 0),
+                                  completion_tokens=usage.get("completion_tokens", 0))
+                    return text, True
+
+            return "⚠️ Received an empty response from the server.", False
+
+        except LLMRetryableError as e:
+            return _hf_status_message(e.status_code) or f"HF Router Error: {e}", False
+        except Exception as e:
+            return f"HF Router Error: {str(e)}", False
+
+
+def stream_ollama(prompt: str, model: str = "mistral", host: str = "http://localhost:11434"):
+    """
+    Yield response text as Ollama produces it (NDJSON, one object per line).
+    Returns True once Ollama reports `done`; an error or a stream that ends
+    early raises LLMStreamError so partial text is never taken as complete.
+    """
+    client = get_llm_client()
+    with client.call(f"ollama:{host}", model) as record:
+        try:
+            r = client.post(
+                f"{host}/api/generate",
+                json={"model": model, "prompt": prompt, "stream": True},
+                stream=True, timeout=(10, 120),
+            )
+        except requests.exceptions.ConnectionError:
+            yield "❌ Cannot connect to Ollama. Ensure it is running at the configured host."
+            return
+        except LLMRetryableError as e:
+            yield f"Ollama error {e.status_code}: backend still busy after {BRIEFING_CONFIG['max_retries']} attempts."
+            return
+        with r:
+            if r.status_code != 200:
+                yield f"Ollama error {r.status_code}: {r.text[:300]}"
+                return
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise LLMStreamError(f"Ollama error: {chunk['error']}")
+                if chunk.get("response"):
+                    client.first_token(record)
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    record.update(ok=True, prompt_tokens=chunk.get("prompt_eval_count", 0),
+                                  completion_tokens=chunk.get("eval_count", 0))
+                    return True
+        raise LLMStreamError("Ollama stream ended before the response was complete.")
+
+
+def stream_huggingface(prompt: str, hf_token: str = ""):
+    """
+    Yield completion text from the HF router's server-sent-event stream.
+    Returns True on `[DONE]`; a failure after text has been yielded, or a
+    stream without `[DONE]`, raises LLMStreamError.
+    """
+    clean_token = hf_token.strip()
+    if not clean_token:
+        yield "❌ Error: Please enter your Hugging Face Token in the sidebar."
+        return
+
+    headers = {
+        "Authorization": f"Bearer {clean_token}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+    }
+    client = get_llm_client()
+    with client.call("hf-router", HF_MODEL_ID) as record:
+        try:
+            with client.post(HF_ROUTER_URL, headers=headers, json=_hf_payload(prompt, stream=True),
+                             stream=True, timeout=(10, 120)) as response:
+                status_message = _hf_status_message(response.status_code)
+                if status_message:
+                    yield status_message
+                    return
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue  # blank separators, comments and keep-alives
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        record["ok"] = True
+                        return True
+                    event = json.loads(data)
+                    if event.get("usage"):
+                        record.update(prompt_tokens=event["usage"].get("prompt_tokens", 0),
+                                      completion_tokens=event["usage"].get("completion_tokens", 0))
+                    for choice in event.get("choices", []):
+                        text = choice.get("delta", {}).get("content")
+                        if text:
+                            client.first_token(record)
+                            yield text
+            raise LLMStreamError("HF Router stream ended before [DONE].")
+        except LLMStreamError:
+            raise
+        except LLMRetryableError as e:
+            yield _hf_status_message(e.status_code) or f"HF Router Error: {e}"
+        except Exception as e:
+            # Nothing shown yet: report it like call_huggingface; otherwise fail the stream
+            if record["ttft"] is not None:
+                raise LLMStreamError(f"HF Router Error: {e}") from e
+            yield f"HF Router Error: {str(e)}"
+
+
+def build_briefing_prompt(stats: dict, context: str = "", notes=(), summaries=None) -> str:
+    """Prompt from StatsEngine.summarize output plus sampled notes or map-reduce summaries."""
+    total_events     = stats["events"]
+    total_fatalities = stats["fatalities"]
+    date_range       = f"{stats['first_day']:%d %b %Y} – {stats['last_day']:%d %b %Y}"
+    regions     = stats["counts"]["admin1"].head(5).to_dict()
+    event_types = stats["counts"]["event_type"].to_dict()
+    actors      = stats["counts"]["actor1"].head(8).to_dict()
+    deadliest   = stats["deadliest"]
+
+    if summaries is None:
+        notes_title  = "SAMPLE INCIDENT NOTES"
+        notes_block  = "\n".join(f"- {n}" for n in notes)
+    else:
+        # Map-reduce mode: every note has already been condensed chunk by chunk
+        notes_title  = "SUMMARIES OF ALL INCIDENT NOTES"
+        notes_block  = "\n\n".join(f"[{label}]\n{text}" for label, text in summaries)
 
     deadliest_block = "\n".join(
         f"  [{r['event_date'].strftime('%d %b %Y') if hasattr(r['event_date'], 'strftime') else r['event_date']}] "
@@ -538,7 +1770,7 @@ Key Actors      : {json.dumps(actors)}
 DEADLIEST INCIDENTS:
 {deadliest_block}
 
-SAMPLE INCIDENT NOTES:
+{notes_title}:
 {notes_block}
 
 {"ANALYST FOCUS: " + context if context else ""}
@@ -571,16 +1803,197 @@ RECOMMENDATIONS
     return prompt
 
 
-def generate_briefing(df, context, llm_source, ollama_host, ollama_model, hf_token):
-    prompt = build_briefing_prompt(df, context)
+def call_llm(prompt, llm_source, ollama_host, ollama_model, hf_token):
+    """(text, ok) from the selected backend; on failure the text says what went wrong."""
     if llm_source == "Ollama (Local)":
-        result = call_ollama(prompt, model=ollama_model, host=ollama_host)
+        result, ok = call_ollama(prompt, model=ollama_model, host=ollama_host)
         if result is None:
-            return "❌ Cannot connect to Ollama. Ensure it is running at the configured host."
-        return result
+            return "❌ Cannot connect to Ollama. Ensure it is running at the configured host.", False
+        return result, ok
     elif llm_source == "HuggingFace Router (Free)":
         return call_huggingface(prompt, hf_token)
-    return "No LLM source configured."
+    return "No LLM source configured.", False
+
+
+def stream_llm(prompt, llm_source, ollama_host, ollama_model, hf_token):
+    """Streaming counterpart of call_llm: yields text chunks, returns the completion flag."""
+    if llm_source == "Ollama (Local)":
+        return (yield from stream_ollama(prompt, model=ollama_model, host=ollama_host))
+    elif llm_source == "HuggingFace Router (Free)":
+        return (yield from stream_huggingface(prompt, hf_token))
+    yield "No LLM source configured."
+    return False
+
+
+def generate_briefing(stats, context, llm_source, ollama_host, ollama_model, hf_token,
+                      notes=(), summaries=None):
+    prompt = build_briefing_prompt(stats, context, notes, summaries)
+    return call_llm(prompt, llm_source, ollama_host, ollama_model, hf_token)
+
+
+def stream_briefing(stats, context, llm_source, ollama_host, ollama_model, hf_token,
+                    notes=(), summaries=None):
+    prompt = build_briefing_prompt(stats, context, notes, summaries)
+    return (yield from stream_llm(prompt, llm_source, ollama_host, ollama_model, hf_token))
+
+
+def stream_into(job, pieces):
+    """
+    Append streamed text to `job.partial`, checking for cancellation between
+    pieces; returns the stream's completion flag. The stream is always closed,
+    so a cancelled job gives back its backend slot and connection at once
+    instead of when the finished job (and its traceback) is pruned.
+    """
+    try:
+        while True:
+            try:
+                piece = next(pieces)
+            except StopIteration as end:
+                return end.value
+            job.check()
+            job.partial += piece
+    finally:
+        pieces.close()
+
+
+class BriefingCache:
+    """
+    Generated briefings persisted in SQLite so identical requests, from any
+    session or process, are answered without calling the LLM again. Entries
+    expire after `ttl` seconds; beyond `max_entries` the least recently read
+    are evicted.
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        self.path        = Path(path)
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS briefings ("
+                       "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def key(event_ids, *parts):
+        """Hash of the sampled event ids plus prompt inputs (context, backend, model…)."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update("\x1f".join(sorted(map(str, event_ids))).encode())
+        h.update(json.dumps(parts).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT text FROM briefings WHERE key = ? AND created > ?",
+                             (key, now - self.ttl)).fetchone()
+            if row:
+                db.execute("UPDATE briefings SET accessed = ? WHERE key = ?", (now, key))
+        return row[0] if row else None
+
+    def put(self, key, text):
+        if not text:
+            return
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO briefings VALUES (?, ?, ?, ?)", (key, text, now, now))
+            db.execute("DELETE FROM briefings WHERE created <= ?", (now - self.ttl,))
+            db.execute("DELETE FROM briefings WHERE key NOT IN "
+                       "(SELECT key FROM briefings ORDER BY accessed DESC LIMIT ?)", (self.max_entries,))
+
+
+@st.cache_resource
+def get_briefing_cache():
+    return BriefingCache(BRIEFING_CONFIG["cache_path"], BRIEFING_CONFIG["cache_ttl"],
+                         BRIEFING_CONFIG["cache_entries"])
+
+
+def briefing_chunks(df, by="Region", max_chars=BRIEFING_CONFIG["chunk_chars"]):
+    """
+    Every non-empty incident note as one line, grouped by region (admin1) or
+    ISO week and split so no chunk exceeds `max_chars`. Returns (label, text) pairs.
+    """
+    df = df[df["notes"].fillna("").str.strip() != ""]
+    if df.empty:
+        return []
+    lines = ("- [" + df["event_date"].dt.strftime("%d %b %Y") + "] "
+             + df["event_type"].astype(str) + " in " + df["location"].astype(str) + ", "
+             + df["fatalities"].astype(str) + " fatalities: " + df["notes"].str.slice(0, 400))
+    if by == "Week":
+        group = df["event_date"].dt.to_period("W-SUN").dt.start_time.dt.strftime("Week of %d %b %Y")
+        order = df["event_date"].to_numpy()
+    else:
+        group = df["admin1"].astype(object).fillna("Unspecified region")
+        order = group.to_numpy()
+    chunks = []
+    for label, part in lines.iloc[np.argsort(order, kind="stable")].groupby(group, sort=False):
+        chunk, size = [], 0
+        for line in part:
+            if chunk and size + len(line) > max_chars:
+                chunks.append((label, "\n".join(chunk)))
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line) + 1
+        chunks.append((label, "\n".join(chunk)))
+    return chunks
+
+
+def build_chunk_prompt(label: str, text: str, context: str = "") -> str:
+    return f"""You are a professional security analyst. Summarize the material below for {label}
+in 3-5 plain-text bullet points: dominant actors, tactics, casualties, and any escalation or shift.
+Keep concrete numbers and place names. Do NOT use markdown symbols like ** or ##.
+{"ANALYST FOCUS: " + context if context else ""}
+
+{text}
+"""
+
+
+def summarize_chunks(chunks, context, llm_args, max_workers, progress=None):
+    """
+    Map step: one LLM call per (label, text) chunk, at most `max_workers` in
+    flight. Summaries longer than reduce_chars in total are grouped and
+    summarized again until they fit the final prompt. Returns
+    (summaries, error) as soon as any chunk fails; `progress(done, total)` is
+    called on the script thread.
+    """
+    level = chunks
+    while True:
+        results = [None] * len(level)
+        pool    = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {pool.submit(call_llm, build_chunk_prompt(label, text, context), *llm_args): i
+                       for i, (label, text) in enumerate(level)}
+            for done, future in enumerate(as_completed(futures), 1):
+                result, ok = future.result()
+                if not ok:
+                    return None, result
+                results[futures[future]] = result
+                if progress:
+                    progress(done, len(level))
+        finally:
+            # On failure or cancellation (raised from progress) drop the queued
+            # chunks and return without waiting for the calls still in flight
+            pool.shutdown(wait=False, cancel_futures=True)
+        summaries = [(label, text.strip()) for (label, _), text in zip(level, results)]
+        if len(summaries) == 1 or sum(len(t) for _, t in summaries) <= BRIEFING_CONFIG["reduce_chars"]:
+            return summaries, None
+        # Reduce step: fold neighbouring summaries together and summarize once more
+        level, batch = [], []
+        for label, text in summaries:
+            if batch and sum(len(t) for _, t in batch) + len(text) > BRIEFING_CONFIG["chunk_chars"]:
+                level.append(_merge_summaries(batch))
+                batch = []
+            batch.append((label, text))
+        level.append(_merge_summaries(batch))
+        if len(level) == len(summaries):
+            return summaries, None  # nothing left to fold; the final prompt takes them as they are
+
+
+def _merge_summaries(batch):
+    label = batch[0][0] if len(batch) == 1 else f"{batch[0][0]} – {batch[-1][0]}"
+    return label, "\n\n".join(f"[{l}]\n{t}" for l, t in batch)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -619,17 +2032,10 @@ with st.sidebar:
     start_date = col1.date_input("From", date.today() - timedelta(days=30))
     end_date   = col2.date_input("To",   date.today())
 
+    paginate     = st.toggle("Fetch all pages (past 5,000 rows)", value=True,
+                             help="Walk ACLED result pages until each country is exhausted.")
     fetch_button = st.button("🚀 Fetch Data", type="primary", use_container_width=True)
 
-    st.markdown("---")
-    st.markdown('<div class="section-title">🗺 Map Settings</div>', unsafe_allow_html=True)
-
-    basemap_choice     = st.selectbox("Basemap", list(BASEMAPS.keys()), index=0)
-    selected_map_style = BASEMAPS[basemap_choice]
-    point_radius       = st.slider("Point Radius (m)", 500, 8000, 2000, 250)
-    point_opacity      = st.slider("Point Opacity",    0.1, 1.0,  0.75, 0.05)
-    zoom_level         = st.slider("Default Zoom",     4,   14,   7)
-
     st.markdown("---")
     st.markdown('<div class="section-title">🤖 Briefing LLM</div>', unsafe_allow_html=True)
 
@@ -651,34 +2057,96 @@ with st.sidebar:
         ollama_host  = ""
         ollama_model = ""
 
+    stream_output = st.toggle("Stream briefing as it is written", value=True,
+                              help="Show tokens as the model produces them instead of waiting for the full text.")
+
 # ─────────────────────────────────────────────────────────────────────────────
 # FETCH DATA
 # ─────────────────────────────────────────────────────────────────────────────
 if fetch_button:
-    token = get_access_token(email, password, ACLED_CONFIG["token_url"])
-    if token:
-        with st.spinner("Fetching conflict data from ACLED…"):
-            raw_df = fetch_acled_data(token, tuple(countries_list), start_date, end_date)
-            if not raw_df.empty:
-                raw_df["event_date"] = pd.to_datetime(raw_df["event_date"])
-                raw_df["latitude"]   = pd.to_numeric(raw_df["latitude"],   errors="coerce")
-                raw_df["longitude"]  = pd.to_numeric(raw_df["longitude"],  errors="coerce")
-                raw_df["fatalities"] = pd.to_numeric(raw_df["fatalities"], errors="coerce").fillna(0)
-                raw_df = raw_df.dropna(subset=["latitude", "longitude"])
-
-                st.session_state.original_df  = raw_df
-                st.session_state.data_fetched = True
-                st.session_state.selected_temporal_date = raw_df["event_date"].min().date()
-                st.session_state.briefing_text = ""
-                st.rerun()
-            else:
-                st.warning("No data returned. Try different countries or a wider date range.")
+    store = get_event_store()
+    cache = get_dataset_cache()
+    key   = cache.key(countries_list, start_date, end_date)
+
+    def _fetch(job):
+        def _sync_and_load():
+            job.report(None, "Syncing conflict data from ACLED…")
+            written, failed = sync_event_store(
+                store, key[0], start_date, end_date, paginate,
+                lambda: get_access_token(email, password, ACLED_CONFIG["token_url"], _on_error=job.warn),
+                job=job,
+            )
+            if written is None:
+                return pd.DataFrame(), False
+            cache.invalidate(written)
+            if failed:
+                job.warn(f"{len(failed)} of the requested ranges did not sync; showing what the local "
+                         "store holds. Fetch again to retry them.")
+            job.report(None, "Loading events from the local store…")
+            return load_events(store, *key), not failed
+
+        return cache.get_or_load(key, _sync_and_load)
+
+    previous = get_job_runner().get(st.session_state.fetch_job)
+    if previous is not None and not previous.done:
+        previous.cancel()
+    st.session_state.fetch_job = get_job_runner().submit("fetch", f"Fetching {', '.join(key[0])}", _fetch)
+
+# The fetch runs as a background job: the dashboard stays usable while this
+# fragment polls it, and the loaded frame is applied once it completes.
+fetch_job     = get_job_runner().get(st.session_state.fetch_job)
+fetch_polling = fetch_job is not None and not fetch_job.done
+
+
+@st.fragment(run_every=JOB_CONFIG["poll_interval"] if fetch_polling else None)
+def fetch_status():
+    job = get_job_runner().get(st.session_state.fetch_job)
+    if job is None:
+        return
+    if not job.done:
+        render_job_progress(job)
+        if job.preview is not None:
+            st.dataframe(job.preview, height=240, use_container_width=True)
+        return
+
+    if fetch_polling:
+        st.rerun()  # finished while polling: full rerun to disarm the timer, then report below
+    loaded = job.error is None and not job.cancelled and not job.future.result().empty
+    if loaded and not job.consumed:
+        raw_df = job.future.result()
+        job.consumed = True
+        st.session_state.original_df  = raw_df
+        st.session_state.dataset_id   = dataset_fingerprint(raw_df)
+        st.session_state.data_fetched = True
+        st.session_state.selected_temporal_date = raw_df["event_date"].min().date()
+        st.session_state.briefing_text = ""
+        briefing = get_job_runner().get(st.session_state.briefing_job)
+        if briefing is not None and not briefing.done:
+            briefing.cancel()  # written against the previous dataset
+        st.rerun()
+
+    # The outcome is reported on this run only; later reruns no longer see the job
+    st.session_state.fetch_job = None
+    for message in job.warnings:
+        st.warning(message)
+    if job.cancelled:
+        st.info("Fetch cancelled.")
+    elif job.error is not None:
+        st.error(f"Fetch failed: {job.error}")
+    elif not loaded:
+        st.warning("No data returned. Try different countries or a wider date range.")
+
+
+fetch_status()
 
 # ─────────────────────────────────────────────────────────────────────────────
 # MAIN DASHBOARD
 # ─────────────────────────────────────────────────────────────────────────────
 if st.session_state.data_fetched:
-    full_df = st.session_state.original_df.copy()
+    full_df = st.session_state.original_df  # shared across sessions: never mutate
+    if st.session_state.dataset_id is None:
+        st.session_state.dataset_id = dataset_fingerprint(full_df)
+    fidx = get_filter_index(st.session_state.dataset_id, full_df)
 
     # ══════════════════════════════════════════════════════════════════════════
     # FILTERS
@@ -686,51 +2154,54 @@ if st.session_state.data_fetched:
     with st.expander("🔍  Advanced Filters", expanded=True):
         fc1, fc2, fc3, fc4 = st.columns(4)
 
-        all_event_types = sorted(full_df["event_type"].dropna().unique().tolist())
+        all_event_types = fidx.options("event_type")
         sel_event_types = fc1.multiselect("Event Type", all_event_types,
                                           default=all_event_types, key="f_et")
 
-        all_sub = sorted(full_df["sub_event_type"].dropna().unique().tolist())
+        all_sub = fidx.options("sub_event_type")
         sel_sub = fc2.multiselect("Sub-Event Type", all_sub, default=all_sub, key="f_se")
 
-        all_countries = sorted(full_df["country"].dropna().unique().tolist())
+        all_countries = fidx.options("country")
         sel_countries = fc3.multiselect("Country", all_countries,
                                         default=all_countries, key="f_co")
 
-        all_admin1 = sorted(full_df["admin1"].dropna().unique().tolist())
+        all_admin1 = fidx.options("admin1")
         sel_admin1 = fc4.multiselect("Region (Admin1)", all_admin1,
                                      default=all_admin1, key="f_a1")
 
         fc5, fc6, fc7 = st.columns(3)
 
-        avail_admin2 = sorted(
-            full_df[full_df["admin1"].isin(sel_admin1)]["admin2"].dropna().unique().tolist()
-        )
+        avail_admin2 = fidx.admin2_options(sel_admin1)
         sel_admin2 = fc5.multiselect("District (Admin2)", avail_admin2,
                                      default=avail_admin2, key="f_a2")
 
-        all_actors = sorted(full_df["actor1"].dropna().unique().tolist())
+        all_actors = fidx.options("actor1")
         sel_actors = fc6.multiselect("Primary Actor", all_actors,
                                      default=all_actors, key="f_ac")
 
-        max_fat   = int(full_df["fatalities"].max()) or 1
+        max_fat   = fidx.max_fatalities or 1
         fat_range = fc7.slider("Fatalities Range", 0, max_fat, (0, max_fat), key="f_fr")
 
-    # Apply filters
-    filtered_df = full_df[
-        full_df["event_type"].isin(sel_event_types) &
-        full_df["sub_event_type"].isin(sel_sub) &
-        full_df["country"].isin(sel_countries) &
-        full_df["admin1"].isin(sel_admin1) &
-        full_df["actor1"].isin(sel_actors) &
-        full_df["fatalities"].between(fat_range[0], fat_range[1])
-    ].copy()
+    # Apply filters — AND of precomputed posting-list masks, no string scans
+    selections = {
+        "event_type":     sel_event_types,
+        "sub_event_type": sel_sub,
+        "country":        sel_countries,
+        "admin1":         sel_admin1,
+        "actor1":         sel_actors,
+    }
     if sel_admin2:
-        filtered_df = filtered_df[filtered_df["admin2"].isin(sel_admin2)]
+        selections["admin2"] = sel_admin2
+    engine = st.session_state.filter_engine
+    if engine is None or engine.dataset_id != st.session_state.dataset_id:
+        engine = st.session_state.filter_engine = FilterEngine(
+            st.session_state.dataset_id, fidx, full_df)
+    engine.apply(selections, fat_range)
+    view = engine.view
 
     st.markdown(
         f'<div class="status-bar">'
-        f'🔎 Showing <strong>{len(filtered_df):,}</strong> events after filters'
+        f'🔎 Showing <strong>{len(view):,}</strong> events after filters'
         f'&nbsp;&nbsp;|&nbsp;&nbsp;{len(full_df):,} total records loaded'
         f'</div>',
         unsafe_allow_html=True
@@ -741,13 +2212,16 @@ if st.session_state.data_fetched:
     # ══════════════════════════════════════════════════════════════════════════
     st.markdown('<div class="section-title">📊 Key Metrics</div>', unsafe_allow_html=True)
 
-    days_span = max((filtered_df["event_date"].max() - filtered_df["event_date"].min()).days, 1)
-    avg_daily = len(filtered_df) / days_span
+    # One pass over the filtered rows, shared with the briefing prompt
+    stats_engine = get_stats_engine(st.session_state.dataset_id, full_df)
+    stats        = engine.memo("stats", lambda: stats_engine.summarize(view.rows))
+    days_span    = stats["days_span"]
+    avg_daily    = len(view) / days_span
 
     m1, m2, m3, m4, m5 = st.columns(5)
-    m1.markdown(f'<div class="metric-card info"><div class="metric-value">{len(filtered_df):,}</div><div class="metric-label">Total Events</div></div>', unsafe_allow_html=True)
-    m2.markdown(f'<div class="metric-card danger"><div class="metric-value">{int(filtered_df["fatalities"].sum()):,}</div><div class="metric-label">Fatalities</div></div>', unsafe_allow_html=True)
-    m3.markdown(f'<div class="metric-card"><div class="metric-value">{filtered_df["admin1"].nunique()}</div><div class="metric-label">Regions Affected</div></div>', unsafe_allow_html=True)
+    m1.markdown(f'<div class="metric-card info"><div class="metric-value">{len(view):,}</div><div class="metric-label">Total Events</div></div>', unsafe_allow_html=True)
+    m2.markdown(f'<div class="metric-card danger"><div class="metric-value">{stats["fatalities"]:,}</div><div class="metric-label">Fatalities</div></div>', unsafe_allow_html=True)
+    m3.markdown(f'<div class="metric-card"><div class="metric-value">{len(stats["counts"]["admin1"])}</div><div class="metric-label">Regions Affected</div></div>', unsafe_allow_html=True)
     m4.markdown(f'<div class="metric-card"><div class="metric-value">{days_span}</div><div class="metric-label">Day Span</div></div>', unsafe_allow_html=True)
     m5.markdown(f'<div class="metric-card"><div class="metric-value">{avg_daily:.1f}</div><div class="metric-label">Avg Events / Day</div></div>', unsafe_allow_html=True)
 
@@ -756,136 +2230,217 @@ if st.session_state.data_fetched:
     # ══════════════════════════════════════════════════════════════════════════
     st.markdown('<div class="section-title">🗺 Geospatial Distribution</div>', unsafe_allow_html=True)
 
-    mc = st.columns(5)
-    for idx, (label, key) in enumerate([
-        ("🎨 Categories", "Categories"),
-        ("🔥 Heatmap",    "Heatmap"),
-        ("🎯 Impact",     "Impact"),
-        ("⏳ Temporal",   "Temporal"),
-        ("📍 Cluster",    "Cluster"),
-    ]):
-        if mc[idx].button(label, use_container_width=True):
-            st.session_state.map_mode = key
-
-    display_df = filtered_df.copy()
-
-    if st.session_state.map_mode == "Temporal":
-        unique_dates = sorted(filtered_df["event_date"].dt.date.unique())
-        if unique_dates:
-            if st.session_state.selected_temporal_date not in unique_dates:
-                st.session_state.selected_temporal_date = unique_dates[0]
-            selected_date = st.slider(
-                "Timeline",
-                min_value=unique_dates[0], max_value=unique_dates[-1],
-                value=st.session_state.selected_temporal_date,
-            )
-            display_df = filtered_df[filtered_df["event_date"].dt.date == selected_date].copy()
-            pc1, pc2, _ = st.columns([1, 1, 5])
-            if pc1.button("▶️ Play"):  st.session_state.is_playing = True
-            if pc2.button("⏸️ Stop"):  st.session_state.is_playing = False
-            st.caption(f"{selected_date}  ·  {len(display_df)} events")
-            if st.session_state.is_playing and unique_dates:
-                time.sleep(0.4)
-                idx_now = unique_dates.index(selected_date)
-                st.session_state.selected_temporal_date = unique_dates[(idx_now + 1) % len(unique_dates)]
-                st.rerun()
-
-    lat_c = display_df["latitude"].mean()  if not display_df.empty else 32.0
-    lon_c = display_df["longitude"].mean() if not display_df.empty else 35.0
-    view_state = pdk.ViewState(latitude=lat_c, longitude=lon_c, zoom=zoom_level, pitch=0)
-
-    tooltip = {
-        "html": (
-            "<div style='font-family:Inter,sans-serif;font-size:12px;padding:8px 10px;line-height:1.6;'>"
-            "<b style='color:#2e5fa3;font-size:13px;'>{event_type}</b><br/>"
-            "📍 {location}<br/>"
-            "👤 {actor1}<br/>"
-            "💀 Fatalities: <b>{fatalities}</b><br/>"
-            "<span style='color:#666;font-size:11px;'>{notes}</span>"
-            "</div>"
-        ),
-        "style": {
-            "background": "#ffffff",
-            "color": "#1e2b3c",
-            "border": "1px solid #d1dae8",
-            "border-radius": "8px",
-            "box-shadow": "0 4px 14px rgba(0,0,0,0.10)",
-            "max-width": "300px",
+    # The map is its own fragment: style settings, mode switches and playback
+    # ticks rerun only this section, and while playing it re-executes every
+    # PLAYBACK_INTERVAL s. Fragments cannot write to the sidebar, so the map
+    # settings live here rather than there.
+    playing = st.session_state.is_playing and st.session_state.map_mode == "Temporal"
+
+    @st.fragment(run_every=PLAYBACK_INTERVAL if playing else None)
+    def map_section():
+        with st.expander("⚙️ Map Settings"):
+            ms1, ms2, ms3, ms4 = st.columns(4)
+            basemap_choice = ms1.selectbox("Basemap", list(BASEMAPS.keys()), index=0, key="map_basemap")
+            point_radius   = ms2.slider("Point Radius (m)", 500, 8000, 2000, 250, key="map_radius")
+            point_opacity  = ms3.slider("Point Opacity",    0.1, 1.0,  0.75, 0.05, key="map_opacity")
+            zoom_level     = ms4.slider("Default Zoom",     4,   14,   7, key="map_zoom")
+        selected_map_style = BASEMAPS[basemap_choice]
+
+        mc = st.columns(5)
+        for idx, (label, key) in enumerate([
+            ("🎨 Categories", "Categories"),
+            ("🔥 Heatmap",    "Heatmap"),
+            ("🎯 Impact",     "Impact"),
+            ("⏳ Temporal",   "Temporal"),
+            ("📍 Cluster",    "Cluster"),
+        ]):
+            if mc[idx].button(label, use_container_width=True):
+                st.session_state.map_mode = key
+                if st.session_state.is_playing:
+                    st.session_state.is_playing = False
+                    st.rerun()  # disarm the playback timer
+
+        map_positions = view.rows
+
+        if st.session_state.map_mode == "Temporal":
+            tidx  = engine.memo("temporal", lambda: TemporalIndex(full_df, view.rows))
+            dates = tidx.dates
+            if dates:
+                current = st.session_state.selected_temporal_date
+                if current is None or not dates[0] <= current <= dates[-1]:
+                    st.session_state.selected_temporal_date = dates[0]
+                elif st.session_state.is_playing:
+                    st.session_state.selected_temporal_date = tidx.next_date(current)
+                selected_date = st.slider(
+                    "Timeline",
+                    min_value=dates[0], max_value=dates[-1],
+                    key="selected_temporal_date",
+                )
+                tw1, tw2, _ = st.columns([3, 1, 3])
+                playback = tw1.radio("Playback", ["Single Day", "Rolling Window", "Cumulative"],
+                                     horizontal=True, key="tl_mode")
+                n_days = {"Single Day": 1, "Cumulative": None}.get(playback)
+                if playback == "Rolling Window":
+                    n_days = tw2.number_input("Window (days)", 2, 90, 7, key="tl_window")
+                map_positions = tidx.window_rows(selected_date, n_days)
+                pc1, pc2, _ = st.columns([1, 1, 5])
+                # Play/Stop change the fragment's timer, which needs a full rerun to take effect
+                if pc1.button("▶️ Play") and not st.session_state.is_playing:
+                    st.session_state.is_playing = True
+                    st.rerun()
+                if pc2.button("⏸️ Stop") and st.session_state.is_playing:
+                    st.session_state.is_playing = False
+                    st.rerun()
+                span = {1: f"{selected_date}", None: f"Up to {selected_date}"}.get(
+                    n_days, f"{n_days} days to {selected_date}")
+                st.caption(f"{span}  ·  {len(map_positions)} events  ·  "
+                           f"{tidx.window_fatalities(selected_date, n_days):,} fatalities")
+
+        if st.session_state.map_mode == "Cluster":
+            grid_level = st.slider("Grid Resolution (tile level)", 6, 16, min(zoom_level + 4, 16),
+                                   help="Higher levels give smaller cells. Cells are binned server-side.")
+
+        has_points = len(map_positions) > 0
+        lat_c = float(full_df["latitude"].to_numpy()[map_positions].mean())  if has_points else 32.0
+        lon_c = float(full_df["longitude"].to_numpy()[map_positions].mean()) if has_points else 35.0
+        view_state = pdk.ViewState(latitude=lat_c, longitude=lon_c, zoom=zoom_level, pitch=0)
+
+        tooltip = {
+            "html": (
+                "<div style='font-family:Inter,sans-serif;font-size:12px;padding:8px 10px;line-height:1.6;'>"
+                "<b style='color:#2e5fa3;font-size:13px;'>{event_type}</b><br/>"
+                "📍 {location}<br/>"
+                "👤 {actor1}<br/>"
+                "💀 Fatalities: <b>{fatalities}</b><br/>"
+                "<span style='color:#666;font-size:11px;'>Click for full notes</span>"
+                "</div>"
+            ),
+            "style": {
+                "background": "#ffffff",
+                "color": "#1e2b3c",
+                "border": "1px solid #d1dae8",
+                "border-radius": "8px",
+                "box-shadow": "0 4px 14px rgba(0,0,0,0.10)",
+                "max-width": "300px",
+            }
         }
-    }
 
-    mode = st.session_state.map_mode
-
-    if mode == "Heatmap":
-        layers = [pdk.Layer(
-            "HeatmapLayer", display_df,
-            get_position="[longitude, latitude]",
-            get_weight="fatalities",
-            opacity=point_opacity, threshold=0.05, radiusPixels=40,
-        )]
-    elif mode == "Impact":
-        dm = display_df.copy()
-        max_f = dm["fatalities"].max() or 1
-        dm["radius"] = (dm["fatalities"] / max_f) * 15000 + 800
-        dm["color"]  = dm["fatalities"].apply(
-            lambda f: [185, 28, 28, min(220, int(120 + f * 4))]
-        )
-        layers = [pdk.Layer(
-            "ScatterplotLayer", dm,
-            get_position="[longitude, latitude]",
-            get_radius="radius", get_fill_color="color",
-            pickable=True, stroked=True,
-            get_line_color=[255, 255, 255], line_width_min_pixels=1,
-        )]
-    elif mode == "Cluster":
-        layers = [pdk.Layer(
-            "ScatterplotLayer", display_df,
-            get_position="[longitude, latitude]",
-            get_radius=int(point_radius * 0.6),
-            get_fill_color=[46, 95, 163, 160], pickable=True,
-        )]
-    else:
-        dm = display_df.copy()
-        dm["color"] = dm["event_type"].apply(lambda e: EVENT_COLORS.get(e, DEFAULT_COLOR))
-        layers = [pdk.Layer(
-            "ScatterplotLayer", dm,
-            get_position="[longitude, latitude]",
-            get_radius=point_radius, get_fill_color="color",
-            opacity=point_opacity, pickable=True,
-            auto_highlight=True, highlight_color=[255, 200, 0, 255],
-        )]
-
-    map_col, leg_col = st.columns([5, 1])
-    with map_col:
-        st.pydeck_chart(pdk.Deck(
-            map_style=selected_map_style,
-            layers=layers,
-            initial_view_state=view_state,
-            tooltip=tooltip,
-        ))
-
-    with leg_col:
-        if mode in ("Categories", "Temporal"):
-            lines = '<div class="legend-card"><div class="legend-title">Event Types</div>'
-            for etype, rgba in EVENT_COLORS.items():
-                hc = "#{:02x}{:02x}{:02x}".format(*rgba[:3])
-                lines += (f'<div class="legend-item">'
-                          f'<div class="legend-dot" style="background:{hc};"></div>'
-                          f'{etype}</div>')
-            lines += '</div>'
-            st.markdown(lines, unsafe_allow_html=True)
-        elif mode == "Heatmap":
-            st.markdown('<div class="legend-card"><div class="legend-title">Heatmap</div>'
-                        '<p style="font-size:0.71rem;color:#5a6b7e;">Intensity weighted by fatality count.</p></div>',
-                        unsafe_allow_html=True)
+        mode = st.session_state.map_mode
+
+        def binned(level):
+            # Cached per filter state (via the engine memo) and grid level
+            return engine.memo(("grid", level), lambda: grid_bins(
+                full_df["longitude"].to_numpy()[view.rows], full_df["latitude"].to_numpy()[view.rows],
+                full_df["fatalities"].to_numpy()[view.rows], level))
+
+        if mode == "Heatmap":
+            if len(map_positions) > HEATMAP_POINT_LIMIT:
+                dm = binned(min(zoom_level + 6, 18)).rename(columns={"fatalities": "w"})[["lon", "lat", "w"]]
+                dm = dm[dm["w"] > 0]
+            else:
+                dm = map_payload(full_df, map_positions, tooltip=False).assign(
+                    w=full_df["fatalities"].to_numpy()[map_positions])
+            layers = [pdk.Layer(
+                "HeatmapLayer", dm,
+                get_position="[lon, lat]",
+                get_weight="w",
+                opacity=point_opacity, threshold=0.05, radiusPixels=40,
+            )]
         elif mode == "Impact":
-            st.markdown('<div class="legend-card"><div class="legend-title">Impact</div>'
-                        '<p style="font-size:0.71rem;color:#5a6b7e;">Circle size and colour reflect fatality count.</p></div>',
-                        unsafe_allow_html=True)
+            fat   = full_df["fatalities"].to_numpy()[map_positions]
+            max_f = fat.max() if len(fat) else 1
+            dm = with_rgba(map_payload(full_df, map_positions),
+                           get_event_styles(st.session_state.dataset_id, "Impact", full_df)[map_positions])
+            dm = dm.assign(radius=((fat / (max_f or 1)) * 15000 + 800).round())
+            layers = [pdk.Layer(
+                "ScatterplotLayer", dm, id="events",
+                get_position="[lon, lat]",
+                get_radius="radius", get_fill_color="[r, g, b, a]",
+                pickable=True, stroked=True,
+                get_line_color=[255, 255, 255], line_width_min_pixels=1,
+            )]
+        elif mode == "Cluster":
+            cells = binned(grid_level)
+            share = cells["fatalities"] / max(int(cells["fatalities"].max()) if len(cells) else 0, 1)
+            cells = cells.assign(
+                r=(46 + share * (185 - 46)).round().astype(np.uint8),
+                g=(95 - share * (95 - 28)).round().astype(np.uint8),
+                b=(163 - share * (163 - 28)).round().astype(np.uint8),
+            )
+            layers = [pdk.Layer(
+                "ColumnLayer", cells, id="cells",
+                get_position="[lon, lat]", get_elevation="count",
+                elevation_scale=grid_cell_metres(grid_level, lat_c) / max(int(cells["count"].max()) if len(cells) else 0, 1) * 4,
+                radius=grid_cell_metres(grid_level, lat_c) * 0.45, disk_resolution=4, angle=45,
+                get_fill_color="[r, g, b, 210]", extruded=True, pickable=True,
+                auto_highlight=True, highlight_color=[255, 200, 0, 255],
+            )]
+            view_state.pitch = 40
+            tooltip = dict(tooltip, html=(
+                "<div style='font-family:Inter,sans-serif;font-size:12px;padding:8px 10px;line-height:1.6;'>"
+                "<b style='color:#2e5fa3;font-size:13px;'>{count} events</b><br/>"
+                "💀 Fatalities: <b>{fatalities}</b></div>"
+            ))
         else:
-            st.markdown('<div class="legend-card"><div class="legend-title">Cluster</div>'
-                        '<p style="font-size:0.71rem;color:#5a6b7e;">Events as uniform blue dots.</p></div>',
-                        unsafe_allow_html=True)
+            dm = with_rgba(map_payload(full_df, map_positions),
+                           get_event_styles(st.session_state.dataset_id, "Categories", full_df)[map_positions])
+            layers = [pdk.Layer(
+                "ScatterplotLayer", dm, id="events",
+                get_position="[lon, lat]",
+                get_radius=point_radius, get_fill_color="[r, g, b, a]",
+                opacity=point_opacity, pickable=True,
+                auto_highlight=True, highlight_color=[255, 200, 0, 255],
+            )]
+
+        map_col, leg_col = st.columns([5, 1])
+        with map_col:
+            map_event = st.pydeck_chart(CompactDeck(
+                map_style=selected_map_style,
+                layers=layers,
+                initial_view_state=view_state,
+                tooltip=tooltip,
+            ), on_select="rerun", selection_mode="single-object", key="event_map")
+
+            # Full details (notes, source) are loaded from the base frame only for the clicked event
+            picked = [o for objs in map_event.selection.get("objects", {}).values() for o in objs]
+            if picked and "i" in picked[0]:
+                ev  = full_df.iloc[int(picked[0]["i"])]
+                esc = {c: html.escape(str(ev[c])) for c in
+                       ("event_type", "location", "admin1", "notes", "actor1", "source")}  # free text from ACLED
+                st.markdown(
+                    f'<div class="legend-card"><div class="legend-title">📌 {esc["event_type"]} · '
+                    f'{ev["event_date"]:%d %b %Y} · {esc["location"]}, {esc["admin1"]}</div>'
+                    f'<p style="font-size:0.8rem;color:#1e2b3c;margin:0 0 0.4rem;">{esc["notes"]}</p>'
+                    f'<p style="font-size:0.71rem;color:#5a6b7e;margin:0;">'
+                    f'👤 {esc["actor1"]} · 💀 {ev["fatalities"]} · Source: {esc["source"]}</p></div>',
+                    unsafe_allow_html=True,
+                )
+
+        with leg_col:
+            if mode in ("Categories", "Temporal"):
+                lines = '<div class="legend-card"><div class="legend-title">Event Types</div>'
+                for etype, rgba in EVENT_COLORS.items():
+                    hc = "#{:02x}{:02x}{:02x}".format(*rgba[:3])
+                    lines += (f'<div class="legend-item">'
+                              f'<div class="legend-dot" style="background:{hc};"></div>'
+                              f'{etype}</div>')
+                lines += '</div>'
+                st.markdown(lines, unsafe_allow_html=True)
+            elif mode == "Heatmap":
+                st.markdown('<div class="legend-card"><div class="legend-title">Heatmap</div>'
+                            '<p style="font-size:0.71rem;color:#5a6b7e;">Intensity weighted by fatality count.</p></div>',
+                            unsafe_allow_html=True)
+            elif mode == "Impact":
+                st.markdown('<div class="legend-card"><div class="legend-title">Impact</div>'
+                            '<p style="font-size:0.71rem;color:#5a6b7e;">Circle size and colour reflect fatality count.</p></div>',
+                            unsafe_allow_html=True)
+            else:
+                st.markdown('<div class="legend-card"><div class="legend-title">Cluster</div>'
+                            '<p style="font-size:0.71rem;color:#5a6b7e;">Events binned into grid cells. '
+                            'Column height = event count, blue→red = fatalities.</p></div>',
+                            unsafe_allow_html=True)
+
+    map_section()
 
     # ══════════════════════════════════════════════════════════════════════════
     # ANALYTICS
@@ -900,11 +2455,12 @@ if st.session_state.data_fetched:
         margin=dict(l=10, r=10, t=42, b=10),
     )
 
+    # Totals and timeline come from the memoized summary the KPI cards use
     ac1, ac2 = st.columns(2)
 
     with ac1:
         fig_pie = px.pie(
-            filtered_df, names="event_type",
+            stats["totals"]["event_type"], names="event_type", values="events",
             title="Event Type Distribution",
             color_discrete_sequence=PALETTE, hole=0.42,
         )
@@ -913,40 +2469,38 @@ if st.session_state.data_fetched:
         st.plotly_chart(fig_pie, use_container_width=True)
 
     with ac2:
-        timeline = (
-            filtered_df.groupby(filtered_df["event_date"].dt.date)
-            .agg(events=("event_id_cnty", "count"), fatalities=("fatalities", "sum"))
-            .reset_index()
-        )
-        fig_tl = go.Figure()
-        fig_tl.add_trace(go.Bar(
-            x=timeline["event_date"], y=timeline["events"],
-            name="Events", marker_color="#c8d9f0", opacity=0.9
-        ))
-        fig_tl.add_trace(go.Scatter(
-            x=timeline["event_date"], y=timeline["fatalities"],
-            name="Fatalities", mode="lines+markers",
-            line=dict(color="#b91c1c", width=2.5),
-            marker=dict(size=4), yaxis="y2"
-        ))
-        fig_tl.update_layout(
-            **PLOT_LAYOUT, title="Events & Fatalities Timeline",
-            xaxis=dict(gridcolor="rgba(0,0,0,0.05)"),
-            yaxis=dict(gridcolor="rgba(0,0,0,0.05)", title="Events"),
-            yaxis2=dict(overlaying="y", side="right", title="Fatalities",
-                        gridcolor="rgba(0,0,0,0)"),
-            legend=dict(orientation="h", y=1.1, font=dict(size=11)), bargap=0.15,
-        )
+        def timeline_figure():
+            timeline = stats["timeline"]
+            fig = go.Figure()
+            fig.add_trace(go.Bar(
+                x=timeline["event_date"], y=timeline["events"],
+                name="Events", marker_color="#c8d9f0", opacity=0.9
+            ))
+            fig.add_trace(go.Scatter(
+                x=timeline["event_date"], y=timeline["fatalities"],
+                name="Fatalities", mode="lines+markers",
+                line=dict(color="#b91c1c", width=2.5),
+                marker=dict(size=4), yaxis="y2"
+            ))
+            fig.update_layout(
+                **PLOT_LAYOUT, title=f"Events & Fatalities Timeline · {stats['resolution']}",
+                xaxis=dict(gridcolor="rgba(0,0,0,0.05)"),
+                yaxis=dict(gridcolor="rgba(0,0,0,0.05)", title="Events"),
+                yaxis2=dict(overlaying="y", side="right", title="Fatalities",
+                            gridcolor="rgba(0,0,0,0)"),
+                legend=dict(orientation="h", y=1.1, font=dict(size=11)), bargap=0.15,
+            )
+            return fig
+
+        # Built once per filter state, then reused on reruns
+        fig_tl = engine.memo("timeline_fig", timeline_figure)
         st.plotly_chart(fig_tl, use_container_width=True)
 
     ac3, ac4 = st.columns(2)
 
     with ac3:
-        top_regions = (
-            filtered_df.groupby("admin1")
-            .agg(events=("event_id_cnty", "count"), fatalities=("fatalities", "sum"))
-            .sort_values("fatalities", ascending=True).tail(12).reset_index()
-        )
+        top_regions = (stats["totals"]["admin1"].sort_values("fatalities", kind="stable")
+                       .tail(12).reset_index(drop=True))
         fig_bar = px.bar(
             top_regions, x="fatalities", y="admin1", orientation="h",
             title="Top Regions by Fatalities",
@@ -960,11 +2514,7 @@ if st.session_state.data_fetched:
         st.plotly_chart(fig_bar, use_container_width=True)
 
     with ac4:
-        top_actors = (
-            filtered_df.groupby("actor1")
-            .agg(events=("event_id_cnty", "count"), fatalities=("fatalities", "sum"))
-            .sort_values("events", ascending=False).head(10).reset_index()
-        )
+        top_actors = stats["totals"]["actor1"].head(10).reset_index(drop=True)
         fig_act = px.bar(
             top_actors, x="actor1", y="events",
             title="Top 10 Actors by Event Count",
@@ -983,111 +2533,252 @@ if st.session_state.data_fetched:
     # ══════════════════════════════════════════════════════════════════════════
     st.markdown('<div class="section-title">📋 Detailed Data Explorer</div>', unsafe_allow_html=True)
 
-    cols_to_show = [c for c in [
-        "event_date", "event_type", "sub_event_type", "country",
-        "admin1", "admin2", "location", "actor1", "actor2",
-        "fatalities", "notes", "source"
-    ] if c in filtered_df.columns]
-
-    search_term = st.text_input(
-        "Search within results",
-        placeholder="Filter by keyword — searches all text columns…",
-        key="table_search"
-    )
-    show_df = filtered_df[cols_to_show].copy()
-    if search_term.strip():
-        mask = show_df.apply(
-            lambda col: col.astype(str).str.contains(search_term, case=False, na=False)
-        ).any(axis=1)
-        show_df = show_df[mask]
-        st.caption(f'Showing {len(show_df):,} matching rows for "{search_term}"')
-
-    st.dataframe(
-        show_df,
-        use_container_width=True,
-        height=420,
-        column_config={
-            "event_date":    st.column_config.DateColumn("Date", format="DD MMM YYYY"),
-            "fatalities":    st.column_config.NumberColumn("Fatalities", format="%d ☠"),
-            "notes":         st.column_config.TextColumn("Notes", width="large"),
-            "event_type":    st.column_config.TextColumn("Event Type", width="medium"),
-            "sub_event_type":st.column_config.TextColumn("Sub-Type", width="medium"),
-        }
-    )
+    # Search, paging, sorting and export reruns stay inside this fragment
+    @st.fragment
+    def explorer_section():
+        cols_to_show = [c for c in [
+            "event_date", "event_type", "sub_event_type", "country",
+            "admin1", "admin2", "location", "actor1", "actor2",
+            "fatalities", "notes", "source"
+        ] if c in full_df.columns]
+
+        search_term = st.text_input(
+            "Search within results",
+            placeholder='Keywords or "quoted phrases" — searches notes, places, actors and sources…',
+            key="table_search"
+        )
+        hits = None
+        if search_term.strip():
+            # The index is built on first search and shared; results are ANDed with the filter
+            sidx = get_search_index(st.session_state.dataset_id, full_df)
+            hits = engine.memo(("search", search_term), lambda: sidx.search(search_term))
+        table_sel = None if hits is None else np.isin(view.rows, hits, assume_unique=True)
+        n_table   = len(view) if table_sel is None else int(table_sel.sum())
+        if hits is not None:
+            st.caption(f'Showing {n_table:,} matching rows for "{search_term}"')
+
+        # Sorting and paging happen server-side; only the visible page is sent to the browser
+        tc1, tc2, tc3, tc4 = st.columns([4, 2, 1, 1])
+        shown_cols = tc1.multiselect("Columns", cols_to_show, default=cols_to_show,
+                                     key="tbl_cols") or cols_to_show
+        sort_col   = tc2.selectbox("Sort by", cols_to_show, index=0, key="tbl_sort")
+        page_size  = tc3.selectbox("Rows / page", [50, 100, 250, 500], index=1, key="tbl_ps")
+        n_pages    = max(1, -(-n_table // page_size))
+        if st.session_state.tbl_page > n_pages:
+            st.session_state.tbl_page = n_pages  # seeded in the defaults, so no value= to conflict with
+        page       = tc4.number_input("Page", min_value=1, max_value=n_pages, key="tbl_page")
+        sort_desc  = st.toggle("Descending", value=True, key="tbl_desc")
+
+        table_rows = engine.memo(
+            ("order", search_term, sort_col, sort_desc),
+            lambda: view.sorted_rows(sort_col, ascending=not sort_desc, rows=table_sel),
+        )
+        page_rows = table_rows[(page - 1) * page_size: page * page_size]
+        st.dataframe(
+            full_df[shown_cols].take(page_rows),
+            use_container_width=True,
+            height=420,
+            hide_index=True,
+            column_config={
+                "event_date":    st.column_config.DateColumn("Date", format="DD MMM YYYY"),
+                "fatalities":    st.column_config.NumberColumn("Fatalities", format="%d ☠"),
+                "notes":         st.column_config.TextColumn("Notes", width="large"),
+                "event_type":    st.column_config.TextColumn("Event Type", width="medium"),
+                "sub_event_type":st.column_config.TextColumn("Sub-Type", width="medium"),
+            }
+        )
+        if n_table:
+            st.caption(f"Rows {(page - 1) * page_size + 1:,}–{(page - 1) * page_size + len(page_rows):,} "
+                       f"of {n_table:,}  ·  page {page} / {n_pages}")
+
+        # Exports are encoded only when requested, never on an ordinary rerun
+        ex1, ex2, ex3 = st.columns([2, 1, 1])
+        export_scope = ex1.radio("Export", ["Filtered Data", "Current Table View"],
+                                 horizontal=True, key="ex_scope")
+        export_fmt   = ex2.selectbox("Format", list(EXPORT_FORMATS), key="ex_fmt")
+        if export_scope == "Filtered Data":
+            export_positions, export_cols, export_name = view.rows, list(full_df.columns), "acled_filtered"
+        else:
+            export_positions, export_cols, export_name = table_rows, shown_cols, "acled_view"
+        export_key = (st.session_state.dataset_id, engine.digest, export_scope, export_fmt,
+                      search_term, sort_col, sort_desc, tuple(export_cols))
+
+        ex3.markdown("<div style='height:1.7rem'></div>", unsafe_allow_html=True)
+        if ex3.button("⚙️ Prepare Export", use_container_width=True):
+            with st.spinner(f"Encoding {len(export_positions):,} rows as {export_fmt}…"):
+                st.session_state.export = {
+                    "key":  export_key,
+                    "data": export_rows(full_df, export_positions, export_cols, export_fmt),
+                    "name": f"{export_name}_{date.today()}.{EXPORT_FORMATS[export_fmt][0]}",
+                    "mime": EXPORT_FORMATS[export_fmt][2],
+                }
+
+        prepared = st.session_state.export
+        if prepared and prepared["key"] == export_key:
+            st.download_button(
+                f"📥 Download {prepared['name']} ({len(prepared['data']) / 1e6:.1f} MB)",
+                prepared["data"], prepared["name"], prepared["mime"],
+                use_container_width=True,
+            )
+        elif prepared:
+            st.session_state.export = None  # filters or format changed: drop the stale file
 
-    dl1, dl2 = st.columns(2)
-    dl1.download_button(
-        "📥 Download Filtered Data (CSV)",
-        filtered_df.to_csv(index=False),
-        f"acled_filtered_{date.today()}.csv",
-        "text/csv", use_container_width=True,
-    )
-    dl2.download_button(
-        "📥 Download Current Table View",
-        show_df.to_csv(index=False),
-        f"acled_view_{date.today()}.csv",
-        "text/csv", use_container_width=True,
-    )
+    explorer_section()
 
     # ══════════════════════════════════════════════════════════════════════════
     # AUTO BRIEFING
     # ══════════════════════════════════════════════════════════════════════════
     st.markdown('<div class="section-title">📝 Auto Briefing Generator</div>', unsafe_allow_html=True)
 
-    bg1, bg2 = st.columns([3, 1])
-    with bg1:
-        analyst_context = st.text_area(
-            "Analyst Focus / Custom Instructions (optional)",
-            placeholder="e.g. Focus on civilian impact in northern districts. Highlight any IED usage patterns.",
-            height=85,
-        )
-    with bg2:
-        max_events_llm = st.number_input(
-            "Max Events for LLM", min_value=10, max_value=500, value=150, step=10,
-            help="More events = richer briefing but slower generation."
-        )
-        gen_btn = st.button("⚡ Generate Briefing", type="primary", use_container_width=True)
+    # Generation runs as a background job; while one is in flight this
+    # fragment polls it, showing progress and streamed text as it arrives.
+    briefing_job     = get_job_runner().get(st.session_state.briefing_job)
+    briefing_polling = briefing_job is not None and not briefing_job.done
+
+    @st.fragment(run_every=JOB_CONFIG["poll_interval"] if briefing_polling else None)
+    def briefing_section():
+        bg1, bg2 = st.columns([3, 1])
+        with bg1:
+            analyst_context = st.text_area(
+                "Analyst Focus / Custom Instructions (optional)",
+                placeholder="e.g. Focus on civilian impact in northern districts. Highlight any IED usage patterns.",
+                height=85,
+            )
+            map_reduce = st.toggle(
+                "Summarize all filtered events (map-reduce)", key="brief_map_reduce",
+                help="Condense every incident note chunk by chunk in parallel, "
+                     "then write the briefing from those summaries."
+            )
+            if map_reduce:
+                mr1, mr2 = st.columns(2)
+                chunk_by    = mr1.selectbox("Chunk notes by", ["Region", "Week"], key="brief_chunk_by")
+                map_workers = mr2.slider("Parallel LLM requests", 1, BRIEFING_CONFIG["backend_slots"],
+                                         BRIEFING_CONFIG["map_workers"],
+                                         key="brief_workers",
+                                         help="Set to the number of requests the backend serves at once "
+                                              "(e.g. OLLAMA_NUM_PARALLEL).")
+        with bg2:
+            max_events_llm = st.number_input(
+                "Max Events for LLM", min_value=10, max_value=500, value=150, step=10,
+                help="More events = richer briefing but slower generation.",
+                disabled=map_reduce,
+            )
+            gen_btn = st.button("⚡ Generate Briefing", type="primary", use_container_width=True,
+                                disabled=briefing_polling)
 
-    if gen_btn:
-        if filtered_df.empty:
-            st.warning("No data available. Adjust filters and try again.")
-        else:
-            sample_df = (
-                filtered_df.sample(min(max_events_llm, len(filtered_df)), random_state=42)
-                if len(filtered_df) > max_events_llm else filtered_df.copy()
+        if gen_btn:
+            if view.empty:
+                st.warning("No data available. Adjust filters and try again.")
+            else:
+                llm_args  = (llm_source, ollama_host, ollama_model, hf_token)
+                llm_model = ollama_model if llm_source == "Ollama (Local)" else HF_MODEL_ID
+                notes = ()
+                if map_reduce:
+                    notes_df  = view.frame(["event_date", "event_type", "location", "admin1",
+                                            "fatalities", "notes"])
+                    # The filtered row set is identified by dataset id + mask digest
+                    cache_key = BriefingCache.key(
+                        [st.session_state.dataset_id, engine.digest], analyst_context.strip(),
+                        llm_source, llm_model, "map-reduce", chunk_by,
+                    )
+                else:
+                    # Headline stats cover every filtered row; notes come from the sampled rows
+                    positions   = pd.Series(np.arange(len(view)))
+                    sample_rows = (view.rows[positions.sample(max_events_llm, random_state=42).to_numpy()]
+                                   if len(view) > max_events_llm else view.rows)
+                    notes       = stats_engine.sample_notes(sample_rows)
+                    cache_key   = BriefingCache.key(
+                        full_df["event_id_cnty"].to_numpy()[sample_rows],
+                        analyst_context.strip(), llm_source, llm_model,
+                    )
+                briefings = get_briefing_cache()
+                briefing  = briefings.get(cache_key)
+                if briefing is not None:
+                    st.toast("Same events, focus and model as an earlier briefing — served from cache.")
+                    st.session_state.briefing_text = briefing
+                else:
+                    def _generate(job):
+                        summaries = None
+                        if map_reduce:
+                            chunks = briefing_chunks(notes_df, chunk_by)
+                            job.report(0.0, f"Summarizing {len(chunks):,} chunks via {llm_source}…")
+
+                            def _progress(done, total):
+                                job.check()
+                                job.report(done / total, f"Summarized {done:,} / {total:,} chunks…")
+
+                            summaries, failed = summarize_chunks(
+                                chunks, analyst_context, llm_args, map_workers, progress=_progress)
+                            if summaries is None:
+                                return failed
+                        job.report(None, f"Generating intelligence briefing via {llm_source}…")
+                        if stream_output:
+                            # Tokens collect on the job; the polling fragment shows them as they arrive
+                            completed = bool(stream_into(job, stream_briefing(
+                                stats, analyst_context, *llm_args, notes=notes, summaries=summaries)))
+                            briefing  = job.partial
+                        else:
+                            briefing, completed = generate_briefing(
+                                stats, analyst_context, *llm_args, notes=notes, summaries=summaries)
+                        if completed:
+                            briefings.put(cache_key, briefing)
+                        return briefing
+
+                    st.session_state.briefing_job = get_job_runner().submit(
+                        "briefing", f"Briefing via {llm_source}", _generate)
+                    st.rerun()  # full rerun arms this fragment's polling timer
+
+        job = get_job_runner().get(st.session_state.briefing_job)
+        if job is not None and not job.done:
+            render_job_progress(job)
+            if job.partial:
+                with st.container(border=True):
+                    st.markdown(job.partial)
+        elif job is not None and not job.consumed:
+            job.consumed = True
+            if job.error is not None:
+                st.session_state.briefing_text = f"❌ Briefing failed: {job.error}"
+            elif not job.cancelled:
+                st.session_state.briefing_text = job.future.result()
+        if job is not None and job.done and job.cancelled:
+            st.caption("The last briefing request was cancelled.")
+        if briefing_polling and (job is None or job.done):
+            st.rerun()  # finished while polling: full rerun to disarm the timer
+
+        llm_stats = get_llm_client().stats()
+        if llm_stats:
+            ttft = ("n/a" if llm_stats["ttft_p50"] is None
+                    else f"{llm_stats['ttft_p50']:.1f}s p50 / {llm_stats['ttft_p95']:.1f}s p95")
+            st.caption(f"LLM backends · {llm_stats['calls']:,} recent calls · "
+                       f"{llm_stats['success_rate']:.0%} success · first token {ttft} · "
+                       f"{llm_stats['tokens']:,} tokens")
+
+        if st.session_state.briefing_text:
+            text = st.session_state.briefing_text
+            text_html = (
+                text.replace("CRITICAL", '<span class="risk-critical">CRITICAL</span>')
+                    .replace(" HIGH ",   ' <span class="risk-high">HIGH</span> ')
+                    .replace(" MEDIUM ", ' <span class="risk-medium">MEDIUM</span> ')
+                    .replace(" LOW ",    ' <span class="risk-low">LOW</span> ')
             )
-            with st.spinner(f"Generating intelligence briefing via {llm_source}…"):
-                briefing = generate_briefing(
-                    sample_df, analyst_context,
-                    llm_source, ollama_host, ollama_model, hf_token
-                )
-            st.session_state.briefing_text = briefing
-            st.rerun()
-
-    if st.session_state.briefing_text:
-        text = st.session_state.briefing_text
-        text_html = (
-            text.replace("CRITICAL", '<span class="risk-critical">CRITICAL</span>')
-                .replace(" HIGH ",   ' <span class="risk-high">HIGH</span> ')
-                .replace(" MEDIUM ", ' <span class="risk-medium">MEDIUM</span> ')
-                .replace(" LOW ",    ' <span class="risk-low">LOW</span> ')
-        )
-        st.markdown(
-            f'<div class="briefing-box">'
-            f'<div class="briefing-stamp">🛡️ Intelligence Briefing &nbsp;·&nbsp; Auto-Generated &nbsp;·&nbsp; {today_str}</div>'
-            f'{text_html}</div>',
-            unsafe_allow_html=True,
-        )
-        bc1, bc2 = st.columns(2)
-        bc1.download_button(
-            "📥 Download Briefing (.txt)",
-            data=st.session_state.briefing_text,
-            file_name=f"briefing_{date.today()}.txt",
-            mime="text/plain", use_container_width=True,
-        )
-        if bc2.button("🗑️ Clear Briefing", use_container_width=True):
-            st.session_state.briefing_text = ""
-            st.rerun()
+            st.markdown(
+                f'<div class="briefing-box">'
+                f'<div class="briefing-stamp">🛡️ Intelligence Briefing &nbsp;·&nbsp; Auto-Generated &nbsp;·&nbsp; {today_str}</div>'
+                f'{text_html}</div>',
+                unsafe_allow_html=True,
+            )
+            bc1, bc2 = st.columns(2)
+            bc1.download_button(
+                "📥 Download Briefing (.txt)",
+                data=st.session_state.briefing_text,
+                file_name=f"briefing_{date.today()}.txt",
+                mime="text/plain", use_container_width=True,
+            )
+            # Cleared in a callback so the fragment rerun renders without the briefing
+            bc2.button("🗑️ Clear Briefing", use_container_width=True,
+                       on_click=lambda: st.session_state.update(briefing_text=""))
+
+    briefing_section()
 
 # ─────────────────────────────────────────────────────────────────────────────
 # WELCOME STATE
@@ -0,0 +1,97 @@
+import json
+import threading
+
+import pytest
+
+import app
+
+
+class StreamResponse:
+    """Ollama NDJSON stream that pauses after its first piece until released."""
+
+    def __init__(self, started, release):
+        self.status_code = 200
+        self.closed      = False
+        self.started     = started
+        self.release     = release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def iter_lines(self):
+        yield json.dumps({"response": "SITUATION ", "done": False})
+        self.started.set()
+        self.release.wait(5)
+        while True:
+            yield json.dumps({"response": "more ", "done": False})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = app.LLMClient(slots=1)
+    monkeypatch.setattr(app, "get_llm_client", lambda: client)
+    return client
+
+
+def test_cancelled_stream_releases_backend_slot(client):
+    started, release = threading.Event(), threading.Event()
+    response         = StreamResponse(started, release)
+    client.post      = lambda *args, **kwargs: response
+    runner           = app.JobRunner(max_workers=1, keep_seconds=3600)
+
+    job = runner.get(runner.submit(
+        "briefing", "test", lambda job: app.stream_into(job, app.stream_ollama("prompt"))))
+    assert started.wait(5)
+    job.cancel()
+    release.set()
+
+    assert isinstance(job.future.exception(timeout=5), app.JobCancelled)
+    assert job.partial.startswith("SITUATION")
+    # The finished job is still held by the runner, yet the slot and stream are free
+    assert runner.get(job.id) is job
+    assert response.closed
+    slot = client._queue("ollama:http://localhost:11434")
+    assert slot.acquire(timeout=1)
+    slot.release()
+    assert client.stats()["success_rate"] == 0
+
+
+def test_stream_into_returns_completion_flag(client):
+    def pieces():
+        yield "a"
+        yield "b"
+        return True
+
+    job = app.Job("briefing", "test")
+    assert app.stream_into(job, pieces()) is True
+    assert job.partial == "ab"
+
+
+class JSONResponse:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.body        = body
+        self.text        = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+
+@pytest.mark.parametrize("body, expected", [
+    ({"response": "SITUATION OVERVIEW", "done": True}, ("SITUATION OVERVIEW", True)),
+    ({"done": True}, ("No response from Ollama.", False)),
+    ({"response": "SITUATION", "done": False}, ("No response from Ollama.", False)),
+])
+def test_call_ollama_reports_success_explicitly(client, body, expected):
+    client.post = lambda *args, **kwargs: JSONResponse(body)
+    assert app.call_ollama("prompt") == expected
+
+
+def test_call_llm_failures_are_not_ok(client):
+    client.post = lambda *args, **kwargs: JSONResponse({"error": "model not found"}, status_code=404)
+    text, ok = app.call_llm("prompt", "Ollama (Local)", "http://localhost:11434", "mistral", "")
+    assert not ok and text.startswith("Ollama error 404")
+    assert app.call_llm("prompt", "None", "", "", "") == ("No LLM source configured.", False)
@@ -0,0 +1,106 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import app
+
+
+class StubResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body       = body
+        self.text        = str(body)
+
+    def json(self):
+        return self._body
+
+
+class StubSession:
+    def __init__(self, response):
+        self.response = response
+        self.calls    = 0
+
+    def get(self, *args, **kwargs):
+        self.calls += 1
+        return self.response
+
+
+@pytest.fixture
+def store(tmp_path):
+    return app.EventStore(tmp_path)
+
+
+def test_missing_ranges_without_coverage(store):
+    assert store.missing_ranges("Chad", date(2020, 1, 1), date(2020, 3, 31)) == [
+        (date(2020, 1, 1), date(2020, 3, 31))]
+
+
+def test_mark_covered_merges_adjacent_ranges_and_reports_gaps(store):
+    store._mark_covered("Chad", date(2020, 1, 1), date(2020, 1, 31))
+    store._mark_covered("Chad", date(2020, 3, 1), date(2020, 3, 31))
+    store._mark_covered("Chad", date(2020, 4, 1), date(2020, 4, 30))
+
+    assert store.coverage("Chad") == [(date(2020, 1, 1), date(2020, 1, 31)),
+                                      (date(2020, 3, 1), date(2020, 4, 30))]
+    assert store.missing_ranges("Chad", date(2019, 12, 15), date(2020, 5, 10)) == [
+        (date(2019, 12, 15), date(2019, 12, 31)),
+        (date(2020, 2, 1), date(2020, 2, 29)),
+        (date(2020, 5, 1), date(2020, 5, 10)),
+    ]
+    assert store.missing_ranges("Chad", date(2020, 3, 5), date(2020, 4, 20)) == []
+
+
+def test_mark_covered_never_covers_the_settle_window(store):
+    today = date.today()
+    store._mark_covered("Chad", date(2020, 1, 1), today)
+    (lo, hi), = store.coverage("Chad")
+    assert hi < today
+    assert store.missing_ranges("Chad", date(2020, 1, 1), today)[-1][1] == today
+
+
+@pytest.mark.parametrize("response", [
+    StubResponse(200, {"status": 403, "success": False, "message": "Access denied"}),
+    StubResponse(403, {"message": "Forbidden"}),
+    StubResponse(401, {"message": "Unauthorized"}),
+])
+def test_error_response_is_a_failed_task_and_not_marked_covered(store, monkeypatch, response):
+    session = StubSession(response)
+    monkeypatch.setattr(app, "get_http_session", lambda: session)
+    task    = ("Chad", date(2020, 1, 1), date(2020, 3, 31))
+
+    assert app.fetch_acled_data("tok", (task,)) == {task: None}
+    assert session.calls == 1  # 4xx is not retried
+
+    written, failed = app.sync_event_store(store, ["Chad"], task[1], task[2], True, lambda: "tok")
+    assert written == set()
+    assert failed == {task}
+    assert store.coverage("Chad") == []
+    assert store.missing_ranges("Chad", task[1], task[2]) == [(task[1], task[2])]
+
+
+def test_empty_success_page_marks_range_covered(store, monkeypatch):
+    session = StubSession(StubResponse(200, {"status": 200, "success": True, "count": 0, "data": []}))
+    monkeypatch.setattr(app, "get_http_session", lambda: session)
+
+    assert app.sync_event_store(store, ["Chad"], date(2020, 1, 1), date(2020, 3, 31),
+                                True, lambda: "tok") == (set(), set())
+    assert store.missing_ranges("Chad", date(2020, 1, 1), date(2020, 3, 31)) == []
+
+
+def test_incomplete_load_is_served_but_not_cached():
+    cache  = app.DatasetCache(max_bytes=1 << 20, ttl=60)
+    key    = cache.key(["Chad"], date(2020, 1, 1), date(2020, 3, 31))
+    frame  = pd.DataFrame({"event_id_cnty": ["CHA1"]})
+    loads  = []
+
+    def loader(complete):
+        def load():
+            loads.append(complete)
+            return frame, complete
+        return load
+
+    assert cache.get_or_load(key, loader(False)) is frame
+    assert cache.get_or_load(key, loader(True)) is frame
+    assert cache.get_or_load(key, loader(True)) is frame
+    assert loads == [False, True]
@@ -0,0 +1,47 @@
+import pandas as pd
+import pyarrow as pa
+
+import app
+
+
+def _frame():
+    return pd.DataFrame({
+        "event_id_cnty": ["CHA1", "CHA2"],
+        "admin1":        pd.Categorical(["Lac", "Kanem"]),
+        "fatalities":    [0, 3],
+        "notes":         ["Protest in N'Djamena.", "Clash near Mao."],
+    })
+
+
+def test_fingerprint_is_stable_for_identical_frames():
+    assert app.dataset_fingerprint(_frame()) == app.dataset_fingerprint(_frame())
+
+
+def test_fingerprint_changes_when_a_revision_keeps_the_event_ids():
+    base = _frame()
+    assert app.dataset_fingerprint(base) != app.dataset_fingerprint(base.assign(fatalities=[0, 4]))
+    assert app.dataset_fingerprint(base) != app.dataset_fingerprint(
+        base.assign(notes=["Protest in N'Djamena.", "Revised: clash near Mao."]))
+    assert app.dataset_fingerprint(base) != app.dataset_fingerprint(
+        base.assign(admin1=pd.Categorical(["Lac", "Bahr el Gazel"])))
+
+
+def test_normalize_events_keeps_the_full_record_for_export():
+    table = pa.table({
+        "event_id_cnty":      ["CHA1", "CHA2"],
+        "event_date":         ["2024-01-05", "2024-01-06"],
+        "disorder_type":      ["Political violence", "Demonstrations"],
+        "admin1":             ["Lac", "Kanem"],
+        "latitude":           ["13.1", "14.0"],
+        "longitude":          ["14.2", "15.3"],
+        "fatalities":         ["3", "0"],
+        "civilian_targeting": ["Civilian targeting", ""],
+        "tags":               ["", "crowd size=no report"],
+    })
+    df = app.normalize_events(table)
+    assert list(df.columns) == ["event_id_cnty", "event_date", "admin1", "latitude", "longitude",
+                                "fatalities", "disorder_type", "civilian_targeting", "tags"]
+    assert isinstance(df["admin1"].dtype, pd.CategoricalDtype)
+    assert df["fatalities"].dtype == "int32"
+    assert df["disorder_type"].tolist() == ["Political violence", "Demonstrations"]
+    assert df["tags"].dtype == pd.StringDtype("pyarrow")
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+import app
+
+
+def _frame():
+    return pd.DataFrame({
+        "event_date": pd.to_datetime(["2024-01-01", "2024-01-01", "2024-01-03", "2024-01-04"]),
+        "event_type": pd.Categorical(["Battles", "Riots", "Battles", "Battles"]),
+        "admin1":     pd.Categorical(["Lac", "Lac", "Kanem", None]),
+        "actor1":     pd.Categorical(["A", "B", "A", "A"]),
+        "location":   ["Bol", "Bol", "Mao", "Mao"],
+        "fatalities": np.array([2, 0, 5, 1], dtype="int32"),
+        "notes":      ["one", "", "three", "four"],
+    })
+
+
+def test_summarize_feeds_kpis_and_charts_from_one_pass():
+    stats = app.StatsEngine(_frame()).summarize(np.array([0, 1, 2, 3]))
+
+    assert stats["events"] == 4 and stats["fatalities"] == 8
+    assert stats["counts"]["event_type"].to_dict() == {"Battles": 3, "Riots": 1}
+    totals = stats["totals"]["admin1"]
+    assert totals.to_dict("list") == {"admin1": ["Lac", "Kanem"], "events": [2, 1], "fatalities": [2, 5]}
+    assert stats["resolution"] == "Daily"
+    assert stats["timeline"].to_dict("list") == {
+        "event_date": [pd.Timestamp(d).date() for d in ("2024-01-01", "2024-01-03", "2024-01-04")],
+        "events":     [2, 1, 1],
+        "fatalities": [2, 5, 1],
+    }
+
+
+def test_summarize_subset_and_sample_notes():
+    engine = app.StatsEngine(_frame())
+    stats  = engine.summarize(np.array([1, 2]))
+    assert stats["totals"]["event_type"].to_dict("list") == {
+        "event_type": ["Battles", "Riots"], "events": [1, 1], "fatalities": [5, 0]}
+    assert engine.sample_notes(np.array([0, 1, 2, 3]), k=5) == ["one", "three", "four"]